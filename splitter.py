@@ -4,6 +4,10 @@ Compound Splitter
 
 Usage:
     splitter.py [-v ...] [options] <file>...
+    splitter.py [-v ...] [options] --compile-lexicon
+    splitter.py [-v ...] [options] --serve
+    splitter.py [-v ...] [options] --precompute <file>...
+    splitter.py [-v ...] [options] --verify <file>...
 
 Options:
     --help                      Display this help and exit.
@@ -20,6 +24,40 @@ Options:
     --evaluate                  Evaluate a given gold file and print the results.
     --inspect=<word>            Debugging method to see what happens to a specific word.
     -W --print-wrong            When evaluating, print every incorrect word.
+    --sweep                     When evaluating, compare several configurations (see below).
+    --compile-lexicon           Compile the lexicon into a binary file and exit.
+    --compiled                  Map a compiled lexicon if one exists, in any mode (see below).
+    --no-compiled               Parse the lexicon even if a compiled one exists.
+    --precompute                Write the splits of all words in the files to a table (see below).
+    --compact                   Keep the lexicon in compact arrays (see below).
+    --engine=<...>              Implementation to split words with (see below) [default: fast].
+    --verify                    Compare the splits of --engine to the reference engine (see below).
+    --cache-size=<n>            Remember the splits of the last n distinct words [default: 100000].
+    --max-candidates=<n>        Consider at most n splits of a word (see below).
+    --max-depth=<n>             Consider only splits of at most n parts (see below).
+    --deadline=<ms>             Spend at most ms finding the splits of a word (see below).
+    --stream                    Split every line of large inputs (see below).
+    --column=<n>                In stream mode, split this column (starting with 0) [default: 0].
+    --lang-column=<n>           In stream mode, take each line's language from this column.
+    --window=<n>                In stream mode, lines per block [default: 10000].
+    --workers=<n>               Number of worker processes, 0 for one per CPU [default: 1].
+    --threads                   Make the workers threads sharing one lexicon (see below).
+    --stats                     Print time spent and items processed per phase at exit.
+    --profile-startup           Print where the time to start up went at exit (see below).
+    --preload-vectors           Read the vectors in the background right away (see below).
+    --delta=<file>              Apply word counts from this file to the lexicon (see below).
+    --serve                     Run an HTTP server splitting words (see below).
+    --host=<...>                In server mode, the address to listen on [default: 127.0.0.1].
+    --port=<n>                  In server mode, the port to listen on [default: 8080].
+    --batch-size=<n>            In server mode, split at most n words at once [default: 256].
+    --batch-wait=<ms>           In server mode, wait up to ms for a batch to fill [default: 2].
+
+With --compact, the lexicon is kept in flat arrays like a compiled lexicon
+(see --compile-lexicon) instead of dicts, which takes about a sixth of the
+memory but splits more slowly. Compiled lexica are always compact: they
+start much faster, but split up to about half as fast as parsed ones. So
+they are only used by default for short calls, not with --serve, --stream
+or --precompute; --compiled and --no-compiled override this.
 
 Possible values for the --ranking switch are methods of the Splitter class that
 start with "rank_":
@@ -42,20 +80,108 @@ that start with "clean_":
 - prefix
 - fragments
 
+Possible values for the --engine switch are:
+
+- fast: the lattice, cache, precomputed splits, budgets and so on
+- reference: the plain recursive implementation that the fast one has to agree
+  with, splitting every word from scratch
+
+With --verify, the first column of every line of the given files (which may be
+a gold file) is split by both engines, and every word they split differently
+is printed along with both splits and their scores, followed by the
+throughput of both engines. The exit status is 1 if any word was split
+differently.
+
+With --evaluate --sweep, --ranking and --cleaning can each hold several
+alternatives separated by semicolons, and every combination of them is
+evaluated on the gold file, using up to --workers processes. For example, the
+switches --ranking="most_known,shortest;shortest" --cleaning="general;"
+evaluate four configurations, two of them without any cleaning.
+
+The number of ways to split a word grows exponentially with its length, so
+long words can take very long to split. Budgets for every word can be set
+with --max-candidates, --max-depth and --deadline: once one of them runs out,
+only the splits whose parts are the most frequent are considered, and the split
+is marked as degraded. How often each budget ran out is printed with -v.
+
+Without --stream, the input is read line by line until the first empty line,
+and every line is printed with its split. With --stream, the input is read in
+blocks of --window lines instead and every line is processed: the split of the
+tab-separated column given by --column is appended to each line, and every
+distinct word of a block is only split once. Blocks are split by --workers
+processes, and the output keeps the order of the input. With --lang-column,
+every line is split in the language given in that column (de, sv or hu), or
+in the one given by --lang if it is empty. Each language is only loaded once
+it first occurs. A --delta file only applies to the language given by --lang,
+unless its path holds "{lang}", which is replaced by each language.
+
+With --threads, the --workers of stream and server mode are threads instead
+of processes. They share a single lexicon, without copying anything, but only
+split in parallel on Python builds without the global interpreter lock.
+
+With --serve, the lexicon is loaded once and words are split over HTTP:
+
+- POST /split with a JSON body {"words": [...]} returns {"splits": [...]},
+  where each split is a list of parts; if any were degraded by a budget,
+  "degraded" lists their indices
+- GET /health returns {"status": "ok"}
+- GET /metrics returns counters about requests and batches as JSON
+
+Words of concurrent requests are collected into batches of up to --batch-size
+words, which are split by --workers processes.
+
+With --precompute, the first column of every line of the given files (which
+may be the lexicon itself) is split by --workers processes, and the splits are
+written to a table in lex/ for the current settings. From then on, words are
+looked up in that table before splitting them whenever the settings, lexicon
+and vectors are the same.
+
+Word vectors are only read once semantic_similarity first has to rank a
+word's splits. With --preload-vectors, they are read in a background thread
+right away instead, which server mode always does. With --profile-startup,
+the time spent importing, parsing the options, loading the language (broken
+down by method) and splitting the first word is printed at exit.
+
+With --delta, the lexicon is updated after loading it: every line of the file
+holds a word and its new count, where 0 removes the word. In server mode, the
+file is applied again whenever it changes, keeping the loaded lexicon and
+dropping only the cached splits that the changed words could affect. Taking a
+line out of the file does not undo its change.
+
 """
+# Modules that are slow to import (asyncio, json, multiprocessing, pickle and
+# so on) are imported where they are needed, to keep startup fast
+from time import perf_counter
+started = perf_counter()  # see --profile-startup
 import os.path
-import docopt
-import pickle
-from sys import stderr, version_info, exit
+import gc
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from sys import stdin, stdout, stderr, version_info, exit
 from math import sqrt, log2 as lg
 from operator import itemgetter, mul, add
-from collections import Counter
+from collections import Counter, OrderedDict, deque
 from fileinput import input as fileinput
 from functools import reduce
+from heapq import nlargest
+from zlib import crc32
+from itertools import chain, islice
 __loc__ = os.path.realpath(os.path.join(os.getcwd(),
     os.path.dirname(__file__)))
 
 
+# The supported languages and their binding morphemes
+BINDING_MORPHEMES = {
+        "de": ("s", "e", "en", "nen", "ens", "es", "ns", "er", "n"),
+        "sv": ("s",),
+        "hu": ("ó", "ő", "ba", "ítő", "es", "s", "i", "a"),
+        }
+
+
 def log0(x):
     return 0 if x == 0 else lg(x)
 
@@ -63,9 +189,16 @@ def pairwise(iterable):
     """Iterate over pairs of an iterable."""
     i = iter(iterable)
     j = iter(iterable)
-    next(j)
+    next(j, None)
     yield from zip(i, j)
 
+def contains_any(string, strings, lengths):
+    """Return whether any of strings (all of the given lengths) is in string."""
+    return any(
+            string[i:i+n] in strings
+            for n in lengths for i in range(len(string)-n+1)
+            )
+
 def wrap_functions(fns):
     # fns = [*reversed(fns)]
     def wrapper(arg):
@@ -76,6 +209,745 @@ def wrap_functions(fns):
         return arg
     return wrapper
 
+# Flags stored at the end of a word in the lexicon trie (see Splitter.build_trie)
+WORD, MORPHEME, PREFIX = 1, 2, 4
+# Bump whenever the layout of compiled lexica (see Splitter.compile_lexicon) changes
+LEXICON_FORMAT = 2
+LEXICON_MAGIC = b"CSLX"
+# The same for precomputed split tables (see Splitter.precompute)
+SPLIT_TABLE_FORMAT = 1
+SPLIT_TABLE_MAGIC = b"CSST"
+
+def read_header(f, magic, version):
+    """Return the JSON header of a file written by write_mapped, or None."""
+    import json
+    found, found_version, length = struct.unpack("<4sII", f.read(12))
+    if found != magic or found_version != version:
+        return None
+    return json.loads(f.read(length).decode("utf-8"))
+
+def write_mapped(path, magic, version, header, columns):
+    """
+    Write a JSON header followed by arrays into path (see map_file).
+
+    columns is a sequence of (name, array) pairs, whose lengths and byte
+    order are added to the header. The file is replaced atomically, so
+    readers never see half of it.
+    """
+    import json
+    header = dict(
+            header,
+            lengths={name: len(column) for name, column in columns},
+            byteorder=sys.byteorder,
+            )
+    raw = json.dumps(header).encode("utf-8")
+    offset = 12 + len(raw) + 64  # room for the offset itself
+    offset += -offset % 8
+    header['offset'] = offset
+    raw = json.dumps(header).encode("utf-8").ljust(offset - 12)
+    tmp = path + ".tmp{}".format(os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<4sII", magic, version, len(raw)))
+        f.write(raw)
+        for _, column in columns:
+            data = column.tobytes()
+            f.write(data)
+            f.write(bytes(-len(data) % 8))
+    os.replace(tmp, path)
+
+def map_file(path, magic, version, typecodes):
+    """
+    Map a file written by write_mapped.
+
+    Return its header, a dict of its arrays as memoryviews cast to the given
+    (name, typecode) pairs, and the mmap; or None if the magic, version or
+    byte order doesn't fit. Nothing is copied, and processes mapping the
+    same file share its pages.
+    """
+    import mmap
+    with open(path, "rb") as f:
+        header = read_header(f, magic, version)
+        if header is None or header.get('byteorder') != sys.byteorder:
+            return None
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = header['offset']
+    view = memoryview(data)
+    columns = {}
+    for name, typecode in typecodes:
+        size = header['lengths'][name] * struct.calcsize(typecode)
+        columns[name] = view[offset:offset+size].cast(typecode)
+        offset += size
+        offset += -offset % 8
+    return header, columns, data
+
+
+class Trie(object):
+    """
+    An in-memory prefix trie of nested dicts keyed by character.
+
+    The None key of a node holds the WORD/MORPHEME/PREFIX flags of the string
+    ending there.
+    """
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, word, flag):
+        """Insert a word, marking its end with flag."""
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = node.get(None, 0) | flag
+
+    def discard(self, word, flag):
+        """Clear flag at the end of a word; its nodes are kept."""
+        node = self.root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return
+        if None in node:
+            node[None] &= ~flag
+
+    def walk(self, word, start=0):
+        """
+        Walk along word from start, yielding (end, flags, node) for every
+        slice word[start:end] that is a prefix of something in the trie.
+        """
+        node = self.root
+        for j in range(start, len(word)):
+            node = node.get(word[j])
+            if node is None:
+                return
+            yield j + 1, node.get(None, 0), node
+
+    def flags(self, node, rest):
+        """Follow rest down from a node and return the flags found there."""
+        for char in rest:
+            node = node.get(char)
+            if node is None:
+                return 0
+        return node.get(None, 0)
+
+
+class MappedTrie(object):
+    """
+    A read-only prefix trie stored as flat arrays.
+
+    Nodes are numbered breadth first, so the children of a node are the
+    contiguous, label-sorted range first[node]:first[node+1], and the
+    shallow nodes come first: beginning_counts only covers the nodes up to
+    the depth of the longest beginning, and is shorter than the other
+    arrays. This takes 17 bytes per node plus 8 per shallow node. The arrays
+    are either built in memory (see Splitter.compact_lexicon) or, for a
+    compiled lexicon file, memoryviews into the mmapped file (see load), so
+    that nothing is copied and processes mapping the same file share its
+    pages.
+    """
+    def __init__(self, header, columns):
+        self.header = header
+        for name, _ in self.ARRAYS:
+            setattr(self, name, columns[name])
+
+    # (attribute, array typecode) in the order they are stored
+    ARRAYS = (
+            ('counts', 'Q'),  # frequency of the word ending in a node
+            ('beginning_counts', 'Q'),  # frequency of words beginning with it
+            ('labels', 'I'),  # code point of the character leading to a node
+            ('first', 'I'),  # first child (one more entry, for the last node)
+            ('node_flags', 'B'),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Map a compiled lexicon file, returning None if it doesn't fit."""
+        mapped = map_file(path, LEXICON_MAGIC, LEXICON_FORMAT, cls.ARRAYS)
+        if mapped is None:
+            return None
+        header, columns, data = mapped
+        trie = cls(header, columns)
+        trie.mmap = data
+        return trie
+
+    @classmethod
+    def columns(cls, strings, words, beginnings):
+        """
+        Return the arrays of a trie over strings (mapping each to its flags),
+        with the counts of words and beginnings.
+
+        No Trie is built for this: the nodes at depth d are the distinct
+        prefixes of length d of the sorted strings, which are already in
+        breadth first order, grouped by parent and sorted by label. Each of
+        them is found with a single bisection.
+        """
+        keys = sorted(strings)
+        columns = {name: array(typecode) for name, typecode in cls.ARRAYS}
+        counts, beginning_counts, labels, first, node_flags = (
+                columns[name] for name, _ in cls.ARRAYS)
+        beyond = chr(sys.maxunicode)  # sorts after every continuation
+        deepest = max(map(len, beginnings), default=0)
+        level = [("", 0, len(keys))]  # (prefix, range of keys starting with it)
+        total = 1  # nodes up to and including this level
+        depth = 0
+        while level:
+            below = []
+            for prefix, lo, hi in level:
+                labels.append(ord(prefix[-1]) if prefix else 0)
+                first.append(total + len(below))
+                if lo < hi and len(keys[lo]) == depth:
+                    lo += 1  # the prefix itself is one of the strings
+                    counts.append(words.get(prefix, 0))
+                    node_flags.append(strings[prefix])
+                    if depth <= deepest:
+                        beginning_counts.append(beginnings.get(prefix, 0))
+                else:
+                    counts.append(0)
+                    node_flags.append(0)
+                    if depth <= deepest:
+                        beginning_counts.append(0)
+                while lo < hi:
+                    child = keys[lo][:depth+1]
+                    end = bisect_left(keys, child + beyond, lo, hi)
+                    below.append((child, lo, end))
+                    lo = end
+            total += len(below)
+            level = below
+            depth += 1
+        first.append(total)
+        return columns
+
+    def write(self, path, header):
+        """Write the trie into path, with header added to its own."""
+        write_mapped(
+                path,
+                LEXICON_MAGIC,
+                LEXICON_FORMAT,
+                dict(header, nodes=len(self.counts), sizes=self.header['sizes']),
+                [(name, getattr(self, name)) for name, _ in self.ARRAYS],
+                )
+
+    def child(self, node, char):
+        """Return the child of node reached by char, or None."""
+        code = ord(char)
+        lo = self.first[node]
+        hi = self.first[node+1]
+        k = bisect_left(self.labels, code, lo, hi)
+        if k < hi and self.labels[k] == code:
+            return k
+        return None
+
+    def walk(self, word, start=0):
+        """See Trie.walk."""
+        # child inlined, as this and find are what splitting spends its time on
+        first, labels, node_flags = self.first, self.labels, self.node_flags
+        node = 0
+        for j in range(start, len(word)):
+            code = ord(word[j])
+            hi = first[node+1]
+            node = bisect_left(labels, code, first[node], hi)
+            if node == hi or labels[node] != code:
+                return
+            yield j + 1, node_flags[node], node
+
+    def flags(self, node, rest):
+        """See Trie.flags."""
+        for char in rest:
+            node = self.child(node, char)
+            if node is None:
+                return 0
+        return self.node_flags[node]
+
+    def find(self, word):
+        """Return the node of word, or None."""
+        first, labels = self.first, self.labels
+        node = 0
+        for char in word:
+            code = ord(char)
+            hi = first[node+1]
+            node = bisect_left(labels, code, first[node], hi)
+            if node == hi or labels[node] != code:
+                return None
+        return node
+
+    def strings(self, node=0, prefix=""):
+        """Yield (string, node) for every node below node, depth first."""
+        stack = [(node, prefix)]
+        while stack:
+            node, prefix = stack.pop()
+            yield prefix, node
+            for k in range(self.first[node+1] - 1, self.first[node] - 1, -1):
+                stack.append((k, prefix + chr(self.labels[k])))
+
+
+class MappedCounts(Mapping):
+    """
+    A read-only, Counter-like view on one count column of a MappedTrie.
+
+    Like a Counter, missing keys count as 0; a key is only contained if its
+    count is positive. The column may cover only the first nodes (see
+    MappedTrie); the others count as 0.
+    """
+    def __init__(self, trie, column):
+        self.trie = trie
+        self.column = getattr(trie, column)
+        self.size = trie.header['sizes'][column]
+
+    def __getitem__(self, key):
+        node = self.trie.find(key)
+        return 0 if node is None or node >= len(self.column) else self.column[node]
+
+    def __contains__(self, key):
+        return self[key] > 0
+
+    def __iter__(self):
+        for string, node in self.trie.strings():
+            if node < len(self.column) and self.column[node]:
+                yield string
+
+    def __len__(self):
+        return self.size
+
+    def copy(self):
+        """Return the counts as a Counter."""
+        return Counter({string: self[string] for string in self})
+
+
+class SplitTable(object):
+    """
+    A read-only hash table of precomputed splits, mapped from a file.
+
+    Entry i holds the parts of a split, UTF-8 encoded and separated by
+    SEPARATOR, in records[offsets[i]:offsets[i+1]]; without the separators,
+    that is the word itself. Words are hashed with CRC-32, which unlike
+    hash() is the same in every process, into linearly probed slots holding
+    entry numbers plus one (0 marks an empty slot).
+    """
+    SEPARATOR = "\x1f"
+
+    # (attribute, array typecode) in the order they are stored
+    ARRAYS = (
+            ('slots', 'I'),
+            ('offsets', 'Q'),
+            ('records', 'B'),
+            )
+
+    def __init__(self, header, columns):
+        self.header = header
+        for name, _ in self.ARRAYS:
+            setattr(self, name, columns[name])
+        self.mask = len(self.slots) - 1
+        self.hits = self.misses = 0
+
+    @classmethod
+    def load(cls, path):
+        """Map a split table file, returning None if it doesn't fit."""
+        mapped = map_file(path, SPLIT_TABLE_MAGIC, SPLIT_TABLE_FORMAT, cls.ARRAYS)
+        if mapped is None:
+            return None
+        header, columns, data = mapped
+        table = cls(header, columns)
+        table.mmap = data
+        return table
+
+    @classmethod
+    def write(cls, path, splits, header):
+        """Write an iterable of (word, split) pairs into a table file."""
+        keys = []
+        offsets = array('Q', [0])
+        records = bytearray()
+        for word, split in splits:
+            keys.append(word.encode("utf-8"))
+            records += cls.SEPARATOR.join(split).encode("utf-8")
+            offsets.append(len(records))
+        size = 2
+        while size < 2 * len(keys):
+            size *= 2
+        slots = array('I', [0]) * size
+        for entry, key in enumerate(keys, 1):
+            i = crc32(key) & (size - 1)
+            while slots[i]:
+                i = (i + 1) & (size - 1)
+            slots[i] = entry
+        write_mapped(path, SPLIT_TABLE_MAGIC, SPLIT_TABLE_FORMAT, dict(header, words=len(keys)), [
+            ('slots', slots),
+            ('offsets', offsets),
+            ('records', memoryview(records)),
+            ])
+
+    def get(self, word):
+        """Return the split of a lowercased word as a tuple, or None."""
+        key = word.encode("utf-8")
+        i = crc32(key) & self.mask
+        while True:
+            entry = self.slots[i]
+            if not entry:
+                self.misses += 1
+                return None
+            record = self.records[self.offsets[entry-1]:self.offsets[entry]].tobytes()
+            if record.replace(b"\x1f", b"") == key:
+                self.hits += 1
+                return tuple(record.decode("utf-8").split(self.SEPARATOR))
+            i = (i + 1) & self.mask
+
+    def stats(self):
+        return Counter(hits=self.hits, misses=self.misses, size=self.header['words'])
+
+
+# The Splitter used by split_many's worker processes (see Splitter.split_many)
+worker_splitter = None
+
+def init_worker(cls, language, verbose, args):
+    """Load a Splitter in a worker process that couldn't inherit one."""
+    global worker_splitter
+    worker_splitter = cls(language=language, verbose=verbose, args=args)
+
+def split_chunk(chunk, output):
+    return worker_splitter.split_list(chunk, output)
+
+# The Registry used by its split_many's worker processes
+worker_registry = None
+
+def init_registry_worker(cls, default, verbose, args):
+    """Create a Registry in a worker process that couldn't inherit one."""
+    global worker_registry
+    worker_registry = Registry(default, verbose=verbose, args=args, cls=cls)
+
+def split_pairs(chunk, output):
+    return worker_registry.split_list(chunk, output)
+
+def apply_bounded(pool, function, arguments, *, in_flight):
+    """
+    Yield function(*args) for every tuple of args in an iterable, computed in
+    a pool, in order.
+
+    At most in_flight calls are pending at any time, so arguments is only
+    read as far as needed (and can be an endless stream); otherwise, reading
+    would run ahead of the workers.
+    """
+    arguments = iter(arguments)
+    pending = deque()
+    while True:
+        while len(pending) < in_flight:
+            args = next(arguments, None)
+            if args is None:
+                break
+            pending.append(pool.apply_async(function, args))
+        if not pending:
+            break
+        yield pending.popleft().get()
+
+def map_chunks(pool, function, items, *, workers, chunksize, output):
+    """
+    Yield the results of function(chunk, output) for chunks of chunksize
+    items, computed in a process pool, in order (see apply_bounded).
+    """
+    items = iter(items)
+    chunks = iter(lambda: [*islice(items, chunksize)], [])
+    for results in apply_bounded(pool, function, ((chunk, output) for chunk in chunks), in_flight=4 * workers):
+        yield from results
+
+class SplitServer(object):
+    """
+    An asyncio HTTP server splitting words with a loaded Splitter.
+
+    Words from concurrent requests are queued and split in micro-batches:
+    once a batch is started, every request arriving within batch_wait
+    seconds is added to it (up to batch_size words), and the distinct words
+    of the batch are split at once, in a thread or, with several workers, in
+    a process pool (see Splitter.worker_pool) or a pool of threads. Batches
+    run one after another, so requests arriving meanwhile form the next one.
+
+    Between batches, at most every reload_interval seconds, the Splitter's
+    --delta file is applied again if it has changed (see
+    Splitter.reload_delta); a process pool is then replaced so that the
+    workers see the updated lexicon.
+
+    Requests with a body of more than max_body bytes are answered with 413
+    without reading the body, and their connection is closed.
+    """
+    REASONS = {
+            200: "OK",
+            400: "Bad Request",
+            404: "Not Found",
+            405: "Method Not Allowed",
+            413: "Payload Too Large",
+            500: "Internal Server Error",
+            }
+
+    def __init__(self, spl, *, workers=1, threads=False, batch_size=256, batch_wait=0.002):
+        self.spl = spl
+        self.workers = workers
+        self.threads = threads
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.metrics = Counter()
+        self.queue = None
+        self.pool = None
+        self.reload_interval = 1
+        self.next_reload = 0
+        self.max_body = 1 << 20
+        self.reload_error = None  # the last error applying the --delta file
+
+    async def split(self, words):
+        """Split a list of words as part of the next batch."""
+        import asyncio
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((words, future))
+        return await future
+
+    async def batcher(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            if loop.time() >= self.next_reload:
+                self.next_reload = loop.time() + self.reload_interval
+                self.reload()
+            size = len(batch[0][0])
+            deadline = loop.time() + self.batch_wait
+            while size < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            distinct = [*dict.fromkeys(word.lower() for words, _ in batch for word in words)]
+            self.metrics['batches'] += 1
+            self.metrics['batched_words'] += len(distinct)
+            try:
+                splits = dict(zip(distinct, await self.split_batch(distinct)))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for words, future in batch:
+                if not future.done():
+                    future.set_result([splits[word.lower()] for word in words])
+
+    def reload(self):
+        """
+        Apply changes to the --delta file, if any.
+
+        If the file can't be applied (say, because it is only half written),
+        the lexicon is kept as it is and the file is tried again next time.
+        """
+        try:
+            changed = self.spl.reload_delta()
+        except Exception as e:
+            self.metrics['reload_errors'] += 1
+            if repr(e) != self.reload_error:  # don't repeat it every time
+                self.spl.log(0, "Couldn't apply {}: {!r}".format(self.spl.delta, e))
+            self.reload_error = repr(e)
+            return
+        self.reload_error = None
+        if not changed:
+            return
+        self.metrics['reloads'] += 1
+        if self.pool is not None and not self.threads:
+            self.pool.terminate()
+            self.pool = self.spl.worker_pool(self.workers)
+
+    async def split_batch(self, words):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if not words:
+            return []
+        if self.pool is None:
+            return await loop.run_in_executor(None, lambda: [*map(self.spl.split, words)])
+        size = -(-len(words) // self.workers)
+        futures = []
+        for i in range(0, len(words), size):
+            future = loop.create_future()
+            self.pool.apply_async(
+                    self.spl.split_list if self.threads else split_chunk,
+                    (words[i:i+size], "tuple"),
+                    callback=lambda result, future=future: loop.call_soon_threadsafe(
+                        future.set_result, result),
+                    error_callback=lambda error, future=future: loop.call_soon_threadsafe(
+                        future.set_exception, error),
+                    )
+            futures.append(future)
+        return [split for chunk in await asyncio.gather(*futures) for split in chunk]
+
+    async def respond(self, method, path, body):
+        """Return the status and JSON response to a request."""
+        import json
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, dict(
+                    self.metrics,
+                    cache=self.spl.cache.stats(),
+                    table=self.spl.table and self.spl.table.stats(),
+                    ranking=self.spl.ranking_stats,
+                    budgets=self.spl.budget_stats,
+                    stats=self.spl.stats and self.spl.stats.snapshot(),
+                    )
+        if path != "/split":
+            return 404, {"error": "unknown path"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            words = json.loads(body.decode("utf-8"))["words"]
+            if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected {"words": [...]}'}
+        self.metrics['words'] += len(words)
+        try:
+            splits = await self.split(words)
+        except Exception as e:
+            self.spl.log(1, "Splitting failed:", repr(e))
+            return 500, {"error": "splitting failed: {!r}".format(e)}
+        response = {"splits": splits}
+        degraded = [i for i, split in enumerate(splits) if isinstance(split, Degraded)]
+        if degraded:
+            response["degraded"] = degraded
+            self.metrics['degraded'] += len(degraded)
+            self.metrics.update("degraded_" + splits[i].budget for i in degraded)
+        return 200, response
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection until it is closed."""
+        import asyncio
+        import json
+        try:
+            while True:
+                request = await reader.readline()
+                if not request.strip():
+                    break
+                method, path, version = request.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                self.metrics['requests'] += 1
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                if length > self.max_body:
+                    # the unread body would be taken for the next request
+                    status, response = 413, {"error": "body over {} bytes".format(self.max_body)}
+                    close = True
+                else:
+                    body = await reader.readexactly(length)
+                    status, response = await self.respond(method, path.split("?")[0], body)
+                if status != 200:
+                    self.metrics['errors'] += 1
+                data = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write((
+                    "HTTP/1.1 {} {}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    "Content-Length: {}\r\n"
+                    "{}\r\n"
+                    ).format(
+                        status, self.REASONS[status], len(data),
+                        "Connection: close\r\n" if close else "",
+                        ).encode("latin-1") + data)
+                await writer.drain()
+                if close:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        """Serve forever."""
+        import asyncio
+        self.queue = asyncio.Queue()
+        self.spl.preload_vectors()  # sooner or later, some request will need them
+        if self.workers > 1:
+            self.pool = self.spl.worker_pool(self.workers, threads=self.threads)
+        batcher = asyncio.ensure_future(self.batcher())
+        server = await asyncio.start_server(self.handle, host, port)
+        self.spl.log(1, "Serving on", *(s.getsockname() for s in server.sockets))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if self.pool is not None:
+                self.pool.terminate()
+
+# The candidates of the gold file a sweep's workers evaluate (see Splitter.sweep)
+worker_gold = None
+
+def evaluate_in_worker(gold_file, rankings, cleanings):
+    global worker_gold
+    if worker_gold is None:  # the worker wasn't forked
+        worker_gold = worker_splitter.gold_candidates(gold_file)
+    return worker_splitter.evaluate_candidates(worker_gold, rankings, cleanings)
+
+def read_lines(files, buffering=1 << 20):
+    """Yield the lines of the given files ("-" is stdin) with large buffers."""
+    for name in files:
+        if name == "-":
+            f = open(stdin.fileno(), buffering=buffering, closefd=False)
+        else:
+            f = open(name, buffering=buffering)
+        with f:
+            yield from f
+
+def split_stream(spl, lines, out, *, column=0, lang_column=None, window=10000, workers=1, threads=False):
+    """
+    Split one column of every tab-separated line and write it to out.
+
+    The split is appended to each line (lines without that column are passed
+    through as they are). Lines are processed in blocks of window lines, in
+    which each distinct word is only split once; all blocks go through a
+    single spl.split_many, so they are split in parallel but written in
+    order.
+
+    With lang_column, spl is a Registry, and the word of each line is split
+    in the language given in that column (or the default language, if the
+    column is empty or missing). Lines in other languages are passed through.
+    The languages of the first block are loaded before the workers are
+    forked, so that they share them instead of each loading its own.
+    """
+    pending = deque()  # blocks that have been read but not written yet
+
+    def key(row):
+        """Return what to split for a row, or None."""
+        word = row[column].strip() if len(row) > column else ""
+        if not word or lang_column is None:
+            return word or None
+        language = (row[lang_column].strip() if len(row) > lang_column else "") or spl.default
+        return (language, word) if language in spl else None
+
+    def words():
+        for block in iter(lambda: [*islice(lines, window)], []):
+            rows = [line.rstrip("\r\n").split("\t") for line in block]
+            keys = [*map(key, rows)]
+            distinct = [*dict.fromkeys(k for k in keys if k is not None)]
+            pending.append((rows, keys, distinct))
+            yield from distinct
+
+    done = []
+    def flush():
+        while pending and len(done) >= len(pending[0][2]):
+            rows, keys, distinct = pending.popleft()
+            result = dict(zip(distinct, done))
+            del done[:len(distinct)]
+            out.write("".join(
+                "\t".join(row) + ("\t" + result[k] if k is not None else "") + "\n"
+                for row, k in zip(rows, keys)
+                ))
+
+    remaining = words()
+    first = [*islice(remaining, 1)]  # reads the first block (or more, if it has no words)
+    if lang_column is not None:
+        for language in {language for _, _, distinct in pending for language, _ in distinct}:
+            spl[language]
+    for split in spl.split_many(chain(first, remaining), workers=workers, threads=threads, output="eval"):
+        done.append(split)
+        flush()
+    flush()
+    out.flush()
+
 def docopt_switch(args, switch, default):
     """Workaround for docopt/docopt/51"""
     if args[switch]:
@@ -85,7 +957,270 @@ def docopt_switch(args, switch, default):
     else:
         return default
 
+class VectorStore(object):
+    """
+    Word vectors exported by utils/export_vectors.py.
+
+    The matrix is memory-mapped (so processes share its pages) and its rows
+    are already normalized, so similarity is a plain dot product. It quacks
+    like the gensim model it replaces, as far as Splitter is concerned.
+    """
+    def __init__(self, matrix_path, vocab_path):
+        import numpy
+        # a plain ndarray view on the map indexes much faster than a memmap
+        self.matrix = numpy.asarray(numpy.load(matrix_path, mmap_mode="r"))
+        with open(vocab_path, encoding="utf-8") as f:
+            self.index = {word: row for row, word in enumerate(f.read().split("\n"))}
+
+    def similarity(self, left, right):
+        """Return the cosine similarity of two words; KeyError if unknown."""
+        return float(
+                self.matrix[self.index[left]].astype("float32")
+                @ self.matrix[self.index[right]].astype("float32")
+                )
+
+    def similarities(self, pairs):
+        """
+        Return a dict of the similarities of many pairs of words at once.
+
+        Pairs with an unknown word map to None.
+        """
+        import numpy
+        pairs = [*pairs]
+        known = [(l, r) for l, r in pairs if l in self.index and r in self.index]
+        result = dict.fromkeys(pairs)
+        if known:
+            rows = numpy.array([(self.index[l], self.index[r]) for l, r in known])
+            sims = numpy.einsum(
+                    "ij,ij->i",
+                    self.matrix[rows[:, 0]].astype("float32"),
+                    self.matrix[rows[:, 1]].astype("float32"),
+                    )
+            result.update(zip(known, sims.tolist()))
+        return result
+
+
+class LRUCache(object):
+    """
+    A size-bounded mapping that forgets the least recently used entries.
+
+    Hits, misses and evictions are counted; a maxsize of 0 disables caching.
+    It can be used from several threads at once.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        """Forget all entries (but not the statistics)."""
+        with self.lock:
+            self.data.clear()
+
+    def invalidate(self, predicate):
+        """Forget every entry whose key satisfies predicate, returning how many."""
+        with self.lock:
+            stale = [key for key in self.data if predicate(key)]
+            for key in stale:
+                del self.data[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def stats(self):
+        return Counter(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                invalidations=self.invalidations,
+                size=len(self.data),
+                )
+
+
+class Stats(object):
+    """
+    Calls, items processed and time spent in each phase of splitting.
+
+    Phases are instrumented by wrapping the methods implementing them (see
+    Splitter.instrument), so there is no cost at all when this is not used.
+    """
+    def __init__(self):
+        self.calls = Counter()
+        self.items = Counter()
+        self.seconds = Counter()
+
+    def timed(self, phase, fn):
+        """Wrap fn, counting the calls with a result other than None as items."""
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            result = fn(*args, **kwargs)
+            self.seconds[phase] += perf_counter() - start
+            self.calls[phase] += 1
+            if result is not None:
+                self.items[phase] += 1
+            return result
+        return wrapper
+
+    def add(self, phase, seconds):
+        """Count a call of phase that took seconds, timed by the caller."""
+        self.calls[phase] += 1
+        self.seconds[phase] += seconds
+
+    def timed_iter(self, phase, fn):
+        """Wrap a generator function, counting the items it yields."""
+        def wrapper(*args, **kwargs):
+            self.calls[phase] += 1
+            iterator = fn(*args, **kwargs)
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.seconds[phase] += perf_counter() - start
+                    return
+                self.seconds[phase] += perf_counter() - start
+                self.items[phase] += 1
+                yield item
+        return wrapper
+
+    def snapshot(self):
+        """Return {phase: {'calls': ..., 'items': ..., 'seconds': ...}}."""
+        return {
+                phase: {
+                    'calls': self.calls[phase],
+                    'items': self.items[phase],
+                    'seconds': self.seconds[phase],
+                    }
+                for phase in self.calls
+                }
+
+    def report(self):
+        """Return the snapshot as a table, slowest phases first."""
+        lines = ["{:<32}{:>10}{:>12}{:>12}".format("phase", "calls", "items", "seconds")]
+        for phase, numbers in sorted(self.snapshot().items(), key=lambda x: -x[1]['seconds']):
+            lines.append("{:<32}{calls:>10}{items:>12}{seconds:>12.3f}".format(phase, **numbers))
+        return "\n".join(lines)
+
+
+class Lattice(object):
+    """
+    The segmentation lattice of a single word, as built by Splitter.lattice.
+
+    Iterating over it lazily yields every segmentation as a tuple of parts, in
+    the same order the old recursive enumeration did.
+    """
+    def __init__(self, word, edges, explored=0):
+        self.word = word
+        self.edges = edges
+        self.nodes = len(edges)
+        self.explored = explored  # number of edges looked at while building
+
+    @property
+    def stats(self):
+        """Return how many nodes and edges were explored for this word."""
+        return Counter(nodes=self.nodes, edges=self.explored)
+
+    def __iter__(self):
+        return self.paths()
+
+    def paths(self, max_depth=0):
+        """
+        Yield every segmentation, or only those of at most max_depth parts.
+
+        If any longer segmentation was left out, self.pruned is set.
+        """
+        word, edges, end = self.word, self.edges, len(self.word)
+        self.pruned = False
+        if not end:
+            return
+        stack = [(0, ())]
+        while stack:
+            i, parts = stack.pop()
+            if i == end:
+                yield parts
+                continue
+            if max_depth and len(parts) >= max_depth:
+                self.pruned = True
+                continue
+            for j in reversed(edges[i]):
+                stack.append((j, (*parts, word[i:j])))
+
+    def beam(self, score, width, max_depth=0):
+        """
+        Return up to width segmentations with the highest sum of score(part).
+
+        Nodes are visited from left to right, keeping only the width best
+        partial segmentations that end in each, so this takes time linear in
+        the number of edges however many segmentations there are.
+        """
+        word, end = self.word, len(self.word)
+        if not end:
+            return []
+        beams = {0: [(0, ())]}
+        for i in sorted(self.edges):
+            partial = nlargest(width, beams.pop(i, ()), key=itemgetter(0))
+            if i == end:
+                return [parts for _, parts in partial]
+            for total, parts in partial:
+                if max_depth and len(parts) >= max_depth:
+                    continue
+                for j in self.edges[i]:
+                    part = word[i:j]
+                    beams.setdefault(j, []).append((total + score(part), (*parts, part)))
+        return []
+
+
+class Degraded(tuple):
+    """
+    A split that was chosen after a budget ran out (see
+    Splitter.bounded_splits), and so might not be the best one.
+
+    It is a tuple of parts like any other split; budget names the budget.
+    """
+    def __new__(cls, parts, budget):
+        self = super().__new__(cls, parts)
+        self.budget = budget
+        return self
+
+    def __reduce__(self):
+        return Degraded, (tuple(self), self.budget)
+
+
 class Splitter(object):
+    # where the lexica, affix lists and vectors are read from
+    lexicon_dir = os.path.join(__loc__, "lex")
+    # fewest distinct pairs worth scoring in one batch (prepare_semantic_similarity)
+    min_batch_pairs = 8
+    # splits kept per lattice node once a budget has run out (bounded_splits)
+    beam_width = 32
+    # attributes that may still be set once frozen: they are kept per thread
+    # (similarities) or set only once, under a lock (the vectors, see vec)
+    lazy_attributes = frozenset({'similarities', 'vectors', 'preloading'})
+
     def log(self, level, *args, **kwargs):
         """Print to stderr if verbose mode is set"""
         if self.verbose >= level:
@@ -94,12 +1229,30 @@ class Splitter(object):
     def __init__(self, *, language="de", verbose=False, args):
         """Initialize the Splitter."""
         self.verbose = verbose
+        self.args = args
+        self.startup = None
+        if args.get('--profile-startup'):
+            self.profile_startup()
         self.log(2, args)
         self.force_split = docopt_switch(args, '--force-split', False)
         self.use_stopwords = docopt_switch(args, '--stopwords', True)
         self.min_freq = int(args.get('--min-freq', '2'))
         self.words = Counter()
         self.beginnings = Counter()
+        self.stopwords = None
+        self.updated = False  # whether the lexicon was changed since reading it
+        self.frozen = False  # see freeze
+        self.local = threading.local()  # state of the split running in a thread
+        self.engine = args.get('--engine') or 'fast'
+        if self.engine == 'reference':
+            self.split = self.split_reference
+            self.splits = self.splits_reference
+            self.choose = self.choose_reference
+        elif self.engine != 'fast':
+            raise NotImplementedError("unknown engine: " + self.engine)
+        # the reference engine keeps the lexicon in plain dicts
+        self.compact = bool(args.get('--compact')) and self.engine != 'reference'
+        self.use_compiled = bool(args.get('--compiled')) and self.engine != 'reference'
         self.set_language(language)
         self.read_lexicon(limit=args.get('--limit', 125000))
         if '--ranking' in args and args['--ranking'] is not None:
@@ -112,41 +1265,205 @@ class Splitter(object):
         else:
             self.cleanings = 'general', 'last_parts', 'prefix', 'fragments', 'suffix'
         self.log(2, "Cleanings:", self.cleanings)
-        self.clean = wrap_functions([getattr(self, 'clean_' + method) for method in self.cleanings])
-        if 'semantic_similarity' in self.rankings:
-            self.read_vectors()
-        else:
-            self.vec = None
+        self.binding_set = frozenset(self.binding_morphemes)
+        self.stats = None
+        if args.get('--stats'):
+            self.instrument()
+        self.vectors = None  # see vec
+        self.vectors_lock = threading.Lock()
+        self.preloading = None  # the thread reading the vectors, see preload_vectors
+        self.max_candidates = int(args.get('--max-candidates') or 0)
+        self.max_depth = int(args.get('--max-depth') or 0)
+        self.deadline = float(args.get('--deadline') or 0) / 1000
+        self.configure()
         if args['--inspect']:
             self.inspect = args['--inspect']
         else:
             self.inspect = None
         self.print_wrong = args['--print-wrong']
+        self.cache = LRUCache(int(args.get('--cache-size') or 0))
+        self.ranking_stats = Counter()
+        self.budget_stats = Counter()  # how often each budget ran out
+        self.delta = args.get('--delta')
+        if self.delta is not None:
+            self.delta = self.delta.replace('{lang}', self.lang)
+        self.delta_mtime = None
+        self.reload_delta()
+        if self.startup is not None:
+            self.profile_first_split()
+
+    def freeze(self):
+        """
+        Make this Splitter safe to share between threads, and return it.
+
+        split only reads the lexicon, vectors and configuration; what it
+        changes is either local to a call, kept per thread (see similarities)
+        or locked (the cache). Freezing makes sure the rest stays that way:
+        from then on, setting any attribute but the lazy_attributes raises a
+        RuntimeError, and so does changing the lexicon (see update_counts).
+        The configuration and the affix lists are turned into tuples and
+        frozensets. The lexicon's dicts and the cache are not copied, so
+        they are only protected by the methods changing them. Counters like
+        ranking_stats are not locked, so they may miss a few counts.
+        """
+        self.rankings = tuple(self.rankings)
+        self.cleanings = tuple(self.cleanings)
+        self.binding_morphemes = tuple(self.binding_morphemes)
+        self.negative_morphemes = tuple(self.negative_morphemes)
+        self.suffixes = frozenset(self.suffixes)
+        self.prefixes = frozenset(self.prefixes)
+        if self.stopwords is not None:
+            self.stopwords = frozenset(self.stopwords)
+        self.frozen = True
+        return self
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('frozen') and name not in self.lazy_attributes:
+            raise RuntimeError("a frozen Splitter can't be changed")
+        super().__setattr__(name, value)
+
+    def check_frozen(self):
+        if self.frozen:
+            raise RuntimeError("a frozen Splitter can't be changed")
+
+    @property
+    def similarities(self):
+        """The similarities prepared for the split running in this thread."""
+        return getattr(self.local, 'similarities', {})
+
+    @similarities.setter
+    def similarities(self, similarities):
+        self.local.similarities = similarities
+
+    def configure(self, rankings=None, cleanings=None):
+        """
+        Change the ranking and/or cleaning methods to use.
+
+        Vectors are only read once semantic_similarity first has to rank
+        something (see vec), or in the background with --preload-vectors;
+        until then, it is only checked that there are some (see
+        check_vectors).
+        """
+        self.check_frozen()
+        if rankings is not None:
+            self.rankings = [*rankings]
+        if cleanings is not None:
+            self.cleanings = [*cleanings]
+        if 'semantic_similarity' in self.rankings and self.vectors is None:
+            self.check_vectors()
+        if self.args.get('--preload-vectors'):
+            self.preload_vectors()
+        self.clean = self.compile_cleanings()
+        self.table = self.load_split_table()
+
+    def instrument(self):
+        """
+        Record statistics about every phase of splitting in self.stats.
+
+        This wraps split_uncached, splits and every cleaning and ranking method
+        of this instance. Cleanings are counted per split going in (calls) and
+        coming out (items). Work done in split_many's worker processes is not
+        included.
+        """
+        self.stats = Stats()
+        self.split_uncached = self.stats.timed('split', self.split_uncached)
+        self.splits = self.stats.timed_iter('splits', self.splits)
+        for name in dir(self):
+            if name.startswith('cleaner_'):
+                phase = 'clean_' + name[len('cleaner_'):]
+                setattr(self, name, self.stats.timed(phase, getattr(self, name)))
+            elif name.startswith('clean_') and not hasattr(self, 'cleaner_' + name[len('clean_'):]):
+                setattr(self, name, self.stats.timed_iter(name, getattr(self, name)))
+            elif name.startswith(('rank_', 'prepare_')):
+                setattr(self, name, self.stats.timed(name, getattr(self, name)))
+
+    def profile_startup(self):
+        """
+        Record the time spent loading this Splitter in self.startup.
+
+        This wraps the methods that read, compile or map the lexicon, the
+        split table, the vectors and the delta (so phases calling each other
+        overlap), and once loading is done, the first split (see
+        profile_first_split).
+        """
+        self.startup = Stats()
+        for name in (
+                'read_lexicon', 'load_compiled_lexicon', 'compile_lexicon', 'parse_lexicon',
+                'build_trie', 'compact_lexicon', 'compile_cleanings', 'load_split_table',
+                'fingerprint', 'read_vectors', 'reload_delta',
+                ):
+            setattr(self, name, self.startup.timed(name, getattr(self, name)))
+
+    def profile_first_split(self):
+        """
+        Record the time the first split takes in self.startup, which includes
+        whatever is only loaded when it is first needed (like the vectors).
+        """
+        split = self.split
+        timed = self.startup.timed('first split', split)
+
+        def first_split(*args, **kwargs):
+            if self.startup.calls['first split']:
+                return split(*args, **kwargs)
+            return timed(*args, **kwargs)
+        self.split = first_split
 
     def set_language(self, language):
         """Set the language and its binding morphemes."""
         self.lang = language
         self.negative_morphemes = []
-        if language == "de":
-            self.binding_morphemes = ["s", "e", "en", "nen", "ens", "es", "ns", "er", "n"]
-        elif language == "sv":
-            self.binding_morphemes = ["s"]
-        elif language == "hu":
-            self.binding_morphemes = ["ó", "ő", "ba", "ítő", "es", "s", "i", "a"]
-        else:
+        if language not in BINDING_MORPHEMES:
             raise NotImplementedError()
+        self.binding_morphemes = [*BINDING_MORPHEMES[language]]
 
     def read_lexicon(self, limit=None):
-        """Read the language-specific lexicon."""
+        """
+        Read the language-specific lexicon.
+
+        If a compiled lexicon for the current settings exists (see
+        compile_lexicon), it is mapped into memory instead of parsing the text
+        files if --compiled is given. A compiled lexicon whose sources
+        have changed since is rebuilt; if it can't be written (e.g. because
+        lex/ is read-only), the text files are parsed instead.
+        """
         if limit is not None:
             limit = int(limit)
+        self.limit = limit
+        path = self.compiled_lexicon_path()
+        if self.use_compiled and os.path.exists(path):
+            if self.load_compiled_lexicon(path):
+                return
+            self.log(1, "Compiled lexicon is outdated, rebuilding", path)
+            try:
+                self.compile_lexicon()
+            except OSError as e:
+                self.log(1, "Couldn't rebuild the compiled lexicon:", e)
+            else:
+                if self.load_compiled_lexicon(path):
+                    return
+        self.parse_lexicon()
+        if self.compact:
+            self.compact_lexicon()
+        else:
+            self.build_trie()
+
+    def parse_lexicon(self):
+        """
+        Parse the lexicon and affix lists from the text files in lex/.
+
+        The trie has to be built afterwards (see build_trie and
+        compact_lexicon).
+        """
+        limit = self.limit
         self.log(
                 1,
-                "Loading " + os.path.join(__loc__, "lex", self.lang + ".lexicon.tsv"),
+                "Loading " + os.path.join(self.lexicon_dir, self.lang + ".lexicon.tsv"),
                 end='',
                 flush=True,
                 )
-        with open(os.path.join(__loc__, "lex", self.lang + ".lexicon.tsv")) as f:
+        self.words = Counter()
+        self.beginnings = Counter()
+        with open(os.path.join(self.lexicon_dir, self.lang + ".lexicon.tsv")) as f:
             for index, line in enumerate(f):
                 if limit is not None and index >= limit:
                     break
@@ -161,21 +1478,324 @@ class Splitter(object):
                 self.words[word] += count
                 self.beginnings[word[:6]] += count
         if self.use_stopwords:
-            with open(os.path.join(__loc__, "lex", self.lang + ".stopwords.txt")) as f:
-                for line in f:
-                    word = line.strip()
-                    if word in self.words:
-                        del self.words[word]
-        with open(os.path.join(__loc__, "lex", self.lang + ".suffixes.txt")) as f:
+            for word in self.read_stopwords():
+                if word in self.words:
+                    del self.words[word]
+        with open(os.path.join(self.lexicon_dir, self.lang + ".suffixes.txt")) as f:
             self.suffixes = set(filter(lambda x: len(x)>2, map(str.strip, f)))
-        with open(os.path.join(__loc__, "lex", self.lang + ".prefixes.txt")) as f:
+        with open(os.path.join(self.lexicon_dir, self.lang + ".prefixes.txt")) as f:
             self.prefixes = set(map(str.strip, f))
         self.log(1, "...done")
 
+    def read_stopwords(self):
+        """Read the stopword list into self.stopwords and return it."""
+        with open(os.path.join(self.lexicon_dir, self.lang + ".stopwords.txt")) as f:
+            self.stopwords = set(map(str.strip, f))
+        return self.stopwords
+
+    def build_trie(self):
+        """
+        Build a prefix trie over the lexicon, binding morphemes and prefixes.
+
+        It has to be rebuilt whenever self.words changes.
+        """
+        self.trie = Trie()
+        for word in self.words:
+            self.trie.insert(word, WORD)
+        for morpheme in self.binding_morphemes:
+            self.trie.insert(morpheme, MORPHEME)
+        for prefix in self.prefixes:
+            self.trie.insert(prefix, PREFIX)
+
+    def compact_lexicon(self):
+        """
+        Replace the parsed lexicon and its trie by flat arrays, laid out like
+        a compiled lexicon but built in memory (see MappedTrie.columns).
+
+        self.words and self.beginnings become MappedCounts, which behave
+        like the Counters they replace for lookups, at a fraction of the
+        memory: no string or int objects per entry, and 17 to 25 bytes per
+        trie node instead of a dict each. Lookups are slower, though.
+        """
+        strings = dict.fromkeys(self.beginnings, 0)
+        for flag, entries in (
+                (WORD, self.words),
+                (MORPHEME, self.binding_morphemes),
+                (PREFIX, self.prefixes),
+                ):
+            for string in entries:
+                strings[string] = strings.get(string, 0) | flag
+        header = {'sizes': {'counts': len(self.words), 'beginning_counts': len(self.beginnings)}}
+        self.trie = MappedTrie(header, MappedTrie.columns(strings, self.words, self.beginnings))
+        self.words = MappedCounts(self.trie, 'counts')
+        self.beginnings = MappedCounts(self.trie, 'beginning_counts')
+
+    def lexicon_sources(self):
+        """Return the text files the lexicon is read from."""
+        names = ["lexicon.tsv", "suffixes.txt", "prefixes.txt"]
+        if self.use_stopwords:
+            names.append("stopwords.txt")
+        return [os.path.join(self.lexicon_dir, self.lang + "." + name) for name in names]
+
+    def compiled_lexicon_path(self):
+        """Return where the compiled lexicon for the current settings lives."""
+        return os.path.join(self.lexicon_dir, "{}.lexicon.{}-{}-{}.bin".format(
+            self.lang,
+            self.limit,
+            self.min_freq,
+            "stop" if self.use_stopwords else "nostop",
+            ))
+
+    def lexicon_key(self):
+        """
+        Return everything a compiled lexicon depends on.
+
+        Besides the settings, this includes the binding morphemes (which
+        subclasses may change) and the size and mtime of every source file.
+        Sources that are missing (e.g. when only the compiled lexicon was
+        deployed) are left out.
+        """
+        return {
+                'lang': self.lang,
+                'limit': self.limit,
+                'min_freq': self.min_freq,
+                'stopwords': self.use_stopwords,
+                'binding_morphemes': [*self.binding_morphemes],
+                'sources': {
+                    os.path.basename(path): [os.stat(path).st_mtime_ns, os.stat(path).st_size]
+                    for path in self.lexicon_sources()
+                    if os.path.exists(path)
+                    },
+                }
+
+    def compile_lexicon(self):
+        """
+        Parse the text lexicon and write it to compiled_lexicon_path().
+
+        The file holds the lexicon trie as flat arrays together with word and
+        beginning frequencies, so that it can be mapped into memory without
+        any parsing and shared between processes.
+        """
+        key = self.lexicon_key()
+        self.parse_lexicon()
+        self.compact_lexicon()
+        path = self.compiled_lexicon_path()
+        self.log(1, "Writing", path)
+        self.trie.write(path, dict(
+            key,
+            suffixes=sorted(self.suffixes),
+            prefixes=sorted(self.prefixes),
+            ))
+        return path
+
+    def load_compiled_lexicon(self, path):
+        """Map a compiled lexicon, returning False if it doesn't fit."""
+        trie = MappedTrie.load(path)
+        if trie is None:
+            return False
+        header = trie.header
+        key = self.lexicon_key()
+        stored = {k: header.get(k) for k in key}
+        stored['sources'] = {k: header['sources'].get(k) for k in key['sources']}
+        if stored != key:
+            return False
+        self.log(1, "Mapping", path)
+        self.trie = trie
+        self.words = MappedCounts(self.trie, 'counts')
+        self.beginnings = MappedCounts(self.trie, 'beginning_counts')
+        self.suffixes = set(header['suffixes'])
+        self.prefixes = set(header['prefixes'])
+        return True
+
+    def thaw(self):
+        """
+        Make a mapped compiled lexicon mutable by copying it into memory.
+
+        Updates (see update_counts) do this the first time they are applied;
+        afterwards, forked workers no longer share the lexicon's pages.
+        """
+        self.check_frozen()
+        if not isinstance(self.words, MappedCounts):
+            return
+        self.log(1, "Copying the compiled lexicon into memory")
+        self.words = self.words.copy()
+        self.beginnings = self.beginnings.copy()
+        self.build_trie()
+
+    def update_counts(self, counts):
+        """
+        Set the frequencies of words in the lexicon without reloading it.
+
+        counts maps words (or is an iterable of (word, count) pairs) to their
+        new frequency. Words that are too short, too rare or stopwords are
+        kept out of the lexicon just like when it is read, so a count of 0
+        removes a word. The beginning frequencies and the trie are updated
+        along, and only the cached splits that the changed words could affect
+        are dropped (see invalidate). Return the set of changed words.
+        """
+        self.thaw()
+        stopwords = ()
+        if self.use_stopwords:
+            stopwords = self.stopwords if self.stopwords is not None else self.read_stopwords()
+        changed = set()
+        for word, count in dict(counts).items():
+            word = word.lower()
+            if len(word) < 4 or count < self.min_freq or word in stopwords:
+                count = 0
+            old = self.words[word]
+            if count == old:
+                continue
+            changed.add(word)
+            beginning = word[:6]
+            self.beginnings[beginning] += count - old
+            if self.beginnings[beginning] <= 0:
+                del self.beginnings[beginning]
+            if count:
+                self.words[word] = count
+                self.trie.insert(word, WORD)
+            else:
+                del self.words[word]
+                self.trie.discard(word, WORD)
+        if changed:
+            self.updated = True
+            self.invalidate(changed)
+        return changed
+
+    def add_words(self, counts):
+        """
+        Add words to the lexicon, or add to their frequencies.
+
+        See update_counts; note that counts of words kept out of the lexicon
+        (e.g. below --min-freq) are not remembered.
+        """
+        added = Counter()
+        for word, count in dict(counts).items():
+            added[word.lower()] += count
+        return self.update_counts({word: self.words[word] + count for word, count in added.items()})
+
+    def remove_words(self, words):
+        """Remove words from the lexicon (see update_counts)."""
+        return self.update_counts({word: 0 for word in words})
+
+    def invalidate(self, changed):
+        """
+        Drop the cached splits that a change of the given words could affect.
+
+        Every lexicon lookup made while splitting a word is for a substring of
+        it, except that rank_beginning_frequency looks up the first six
+        characters of its parts. So only cached words containing one of the
+        changed words (or its beginning, for that ranking) are dropped.
+        """
+        words = changed, {*map(len, changed)}
+        beginnings = {word[:6] for word in changed}
+        beginnings = beginnings, {*map(len, beginnings)}
+
+        def affected(key):
+            word, (rankings, _, _) = key
+            if 'beginning_frequency' in rankings:
+                return contains_any(word, *beginnings)
+            return contains_any(word, *words)
+
+        dropped = self.cache.invalidate(affected)
+        if self.table is not None:
+            self.log(1, "Not using the split table any more")
+            self.table = None
+        self.log(1, "Lexicon updated:", len(changed), "words changed,", dropped, "cached splits dropped")
+        return dropped
+
+    def read_delta(self, path):
+        """
+        Apply a file of lexicon updates as a single batch.
+
+        Every line holds a word and its new count, separated by whitespace
+        (see update_counts). Since counts are absolute, applying the same file
+        twice changes nothing. Return the set of changed words. A malformed
+        line raises a ValueError before anything is changed.
+        """
+        counts = {}
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                word, count = line.split()
+                counts[word.lower()] = int(count)
+        return self.update_counts(counts)
+
+    def reload_delta(self):
+        """
+        Apply the --delta file if it has changed since it was last applied.
+
+        Return the set of changed words. If the file can't be read or parsed,
+        the error is raised with the lexicon unchanged, and the file is
+        applied again next time.
+        """
+        if self.delta is None:
+            return set()
+        try:
+            mtime = os.stat(self.delta).st_mtime_ns
+        except FileNotFoundError:
+            return set()
+        if mtime == self.delta_mtime:
+            return set()
+        self.log(1, "Applying", self.delta)
+        changed = self.read_delta(self.delta)
+        self.delta_mtime = mtime  # only now, so that a broken file is retried
+        return changed
+
     def read_vectors(self):
-        """Read the vector space into self.vec."""
-        with open(os.path.join(__loc__, "lex", "{lang}.vectors.pkl".format(lang=self.lang)), "rb") as f:
-            self.vec = pickle.load(f)
+        """
+        Read the vector space into self.vectors.
+
+        Exported vectors (lex/<lang>.vectors.npy and .vocab) are preferred;
+        otherwise the pickled gensim model is loaded.
+        """
+        import pickle
+        path = self.vectors_path()
+        if os.path.exists(path + ".npy") and os.path.exists(path + ".vocab"):
+            self.vectors = VectorStore(path + ".npy", path + ".vocab")
+            return
+        with open(path + ".pkl", "rb") as f:
+            self.vectors = pickle.load(f)
+
+    def vectors_path(self):
+        """Return the path of the vector files, without their extension."""
+        return os.path.join(self.lexicon_dir, "{lang}.vectors".format(lang=self.lang))
+
+    def check_vectors(self):
+        """Raise a FileNotFoundError if there are no vectors to read."""
+        path = self.vectors_path()
+        if not (os.path.exists(path + ".npy") and os.path.exists(path + ".vocab") or os.path.exists(path + ".pkl")):
+            raise FileNotFoundError(
+                    "semantic_similarity needs {0}.npy and {0}.vocab, or {0}.pkl".format(path))
+
+    def load_vectors(self):
+        """Return the vectors, reading them first if that hasn't happened yet."""
+        if self.vectors is None:
+            with self.vectors_lock:
+                if self.vectors is None:
+                    self.read_vectors()
+        return self.vectors
+
+    vec = property(load_vectors, doc="""
+        The vector space, read when it is first used.
+
+        Reading it takes longer than everything else a short call does, and
+        most words never get to semantic_similarity, so it is only read once
+        a split has to be ranked by it.
+        """)
+
+    def preload_vectors(self):
+        """
+        Start reading the vectors in a background thread, if
+        semantic_similarity is going to need them.
+
+        Splitting can go on meanwhile; the first split that needs the vectors
+        waits for the thread to finish.
+        """
+        if 'semantic_similarity' not in self.rankings or self.vectors is not None or self.preloading:
+            return
+        self.preloading = threading.Thread(target=self.load_vectors, name="preload-vectors", daemon=True)
+        self.preloading.start()
 
     def not_a_binding_morpheme(self, part):
         return part not in self.binding_morphemes
@@ -186,19 +1806,73 @@ class Splitter(object):
         for i in range(minlen, len(word)+1):
             yield word[:i], word[i:]
 
+    def lattice(self, word):
+        """
+        Build the segmentation lattice of a word.
+
+        Every position of the word is a node; an edge from i to j means that
+        word[i:j] is an acceptable part and that the rest of the word (from j
+        on) can itself be segmented. Each suffix is therefore only looked at
+        once, no matter how many splits share it.
+        """
+        word = word.lower()
+        n = len(word)
+        edges = {n: []}
+        candidates = {}  # node -> [(end, needs the rest to be segmentable)]
+        explored = 0
+        todo = [0] if n else []
+        while todo:
+            i = todo[-1]
+            if i in edges:
+                todo.pop()
+                continue
+            if i not in candidates:
+                ends = []
+                j = i
+                # walk the trie along the word; once it runs out, no lexicon
+                # entry can start with word[i:j] any more
+                for j, flags, node in self.trie.walk(word, i):
+                    if flags & (WORD | MORPHEME):
+                        ends.append((j, j < n))
+                    elif self.negative_morphemes:
+                        # only the first negative morpheme is ever tried
+                        if j < n and self.trie.flags(node, self.negative_morphemes[0]) & WORD:
+                            ends.append((j, True))
+                    elif j == n:
+                        # maybe unless it's the last part
+                        ends.append((j, False))
+                if j < n and not self.negative_morphemes:
+                    ends.append((n, False))  # unknown last part
+                candidates[i] = ends
+                explored += len(ends)
+                pending = [j for j, _ in ends if j not in edges]
+                if pending:
+                    todo.extend(reversed(pending))
+                    continue
+            edges[i] = [j for j, rest in candidates[i] if not rest or edges[j]]
+            todo.pop()
+        return Lattice(word, edges, explored)
+
     def splits(self, word):
         """Split a given word in all possible ways."""
+        lattice = self.lattice(word)
+        if self.verbose >= 2:
+            self.log(2, "Lattice:", lattice.stats)
+        yield from lattice
+
+    def splits_reference(self, word):
+        """Split a given word in all possible ways, recursively (see --engine)."""
         for left, right in self.left_slices(word.lower()):
             if left in self.binding_morphemes or left in self.words:
                 if right:  # not the last part
-                    for right in self.splits(right):
+                    for right in self.splits_reference(right):
                         yield (left, *right)
                 else:
                     yield (left,)
             else:  # left part isn't a word, so continue
                 for nm in self.negative_morphemes:
                     if left+nm in self.words:
-                        for right in self.splits(right):
+                        for right in self.splits_reference(right):
                             yield (left, *right)
                     break
                 else:  # nobreak
@@ -208,32 +1882,300 @@ class Splitter(object):
                         # maybe unless it's the last part
                         yield (left,)
 
+    def configuration(self):
+        """Return the settings that the result of split depends on."""
+        return tuple(self.rankings), tuple(self.cleanings), self.force_split
+
+    def fingerprint(self):
+        """
+        Return a digest of everything the result of split depends on.
+
+        That is the configuration, the budgets, the lexicon (see lexicon_key)
+        and, for semantic_similarity, the size and mtime of the vector files.
+        Changes to the lexicon since reading it are not covered (see
+        precompute).
+        """
+        import hashlib
+        import json
+        rankings, cleanings, force_split = self.configuration()
+        state = dict(
+                self.lexicon_key(),
+                splitter=type(self).__qualname__,
+                rankings=rankings,
+                cleanings=cleanings,
+                force_split=force_split,
+                budgets=[self.max_candidates, self.max_depth, self.deadline],
+                )
+        if 'semantic_similarity' in rankings:
+            path = self.vectors_path()
+            state['vectors'] = {
+                    ext: [os.stat(path + ext).st_mtime_ns, os.stat(path + ext).st_size]
+                    for ext in (".npy", ".vocab", ".pkl")
+                    if os.path.exists(path + ext)
+                    }
+        return hashlib.sha1(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def split_table_path(self, fingerprint=None):
+        """Return where the split table for the current settings lives."""
+        return os.path.join(self.lexicon_dir, "{}.splits.{}.bin".format(
+            self.lang,
+            (fingerprint or self.fingerprint())[:16],
+            ))
+
+    def load_split_table(self):
+        """
+        Map the split table for the current settings, returning None if
+        there is none or the lexicon has been changed since reading it.
+        """
+        if self.updated:
+            return None
+        prefix = self.lang + ".splits."
+        if not any(name.startswith(prefix) for name in os.listdir(self.lexicon_dir)):
+            return None  # no need for the fingerprint, which is slow to compute
+        fingerprint = self.fingerprint()
+        path = self.split_table_path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        table = SplitTable.load(path)
+        if table is None or table.header.get('fingerprint') != fingerprint:
+            return None
+        self.log(1, "Mapping", path)
+        return table
+
+    def precompute(self, words, *, workers=None):
+        """
+        Split every word and write the results to a split table.
+
+        The table is stored at split_table_path(), tagged with the settings'
+        fingerprint, and is mapped by every Splitter with the same settings
+        from then on, which looks words up in it before splitting them. The
+        words are split by workers processes (see split_many). Return the
+        path of the table.
+
+        Degraded splits (see bounded_splits) are left out, so they are split
+        again, and marked as such, when they are needed. A lexicon that has
+        been changed since reading it (see update_counts) isn't covered by
+        the fingerprint, so it raises a RuntimeError.
+        """
+        if self.updated:
+            raise RuntimeError("can't precompute the splits of a changed lexicon")
+        self.table = None  # split everything afresh
+        words = [*dict.fromkeys(
+            word for word in map(str.lower, words)
+            if word and SplitTable.SEPARATOR not in word
+            )]
+        fingerprint = self.fingerprint()
+        path = self.split_table_path(fingerprint)
+        rankings, cleanings, force_split = self.configuration()
+        self.log(1, "Splitting", len(words), "words for", path)
+        splits = (
+                (word, split)
+                for word, split in zip(words, self.split_many(words, workers=workers))
+                if not isinstance(split, Degraded)
+                )
+        SplitTable.write(path, splits, dict(
+            fingerprint=fingerprint,
+            lang=self.lang,
+            rankings=rankings,
+            cleanings=cleanings,
+            force_split=force_split,
+            ))
+        self.table = self.load_split_table()
+        return path
+
     def split(self, word, *, output="tuple"):
-        """Split a given word in its parts."""
-        # high-level method. This basically filters the output from splits
+        """
+        Split a given word in its parts.
+
+        Words are looked up in the precomputed split table first, if there is
+        one (see precompute). Other results are cached per lowercased word and
+        configuration (see self.cache). The word given by --inspect always
+        bypasses both.
+        """
         word = word.lower()
+        if self.table is not None and word != self.inspect:
+            best = self.table.get(word)
+            if best is not None:
+                return best if output == "tuple" else self.evalify(best)
+        key = word, self.configuration()
+        best = None if word == self.inspect else self.cache.get(key)
+        if best is None:
+            best = self.split_uncached(word)
+            self.cache[key] = best
+        return best if output == "tuple" else self.evalify(best)
+
+    def worker_pool(self, workers, *, threads=False):
+        """
+        Return a multiprocessing pool whose workers can use split_chunk.
+
+        With threads, it is a pool of threads, which share this Splitter as it
+        is (but can't use split_chunk; use split_list instead). Otherwise,
+        where possible, the workers are forked from this process and thus
+        share the already loaded lexicon and vectors with it (entirely so for
+        compiled lexica, which are mmapped); elsewhere, every worker loads its
+        own Splitter.
+        """
+        import multiprocessing.pool
+        global worker_splitter
+        if threads:
+            return multiprocessing.pool.ThreadPool(workers)
+        if "fork" in multiprocessing.get_all_start_methods():
+            if 'semantic_similarity' in self.rankings:
+                self.load_vectors()  # once here rather than in every worker
+            worker_splitter = self
+            gc.freeze()  # keep the collector from copying the shared pages
+            try:
+                return multiprocessing.get_context("fork").Pool(workers)
+            finally:
+                gc.unfreeze()
+        return multiprocessing.Pool(
+                workers,
+                initializer=init_worker,
+                initargs=(type(self), self.lang, self.verbose, self.args),
+                )
+
+    def split_reference(self, word, *, output="tuple"):
+        """
+        Split a given word like split, but with the reference engine.
+
+        Nothing is cached, looked up in a precomputed table or cut short by
+        budgets (see --engine).
+        """
+        word = word.lower()
+        best = self.choose_reference(word, [*self.splits_reference(word)])
+        return best if output == "tuple" else self.evalify(best)
+
+    def split_many(self, words, *, workers=None, threads=False, chunksize=256, output="tuple"):
+        """
+        Split an iterable of words, yielding the results in input order.
+
+        With more than one worker, chunks of words are split in a process
+        pool (see worker_pool), or, with threads, in a pool of threads sharing
+        this Splitter (which should be frozen, see freeze). Only a bounded
+        number of chunks is in flight at any time, so words can be an endless
+        stream.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for word in words:
+                yield self.split(word, output=output)
+            return
+        with self.worker_pool(workers, threads=threads) as pool:
+            yield from map_chunks(
+                    pool,
+                    self.split_list if threads else split_chunk,
+                    words,
+                    workers=workers,
+                    chunksize=chunksize,
+                    output=output,
+                    )
+
+    def split_list(self, words, output="tuple"):
+        """Split a list of words, returning a list (see split_many)."""
+        return [self.split(word, output=output) for word in words]
+
+    def split_uncached(self, word):
+        """Split a lowercased word in its parts, returning a tuple."""
+        # high-level method. This basically filters the output from splits
         if word == self.inspect:
             print("Splitting", word)
         self.log(2, "Splitting", word)
-        splits = self.splits(word)
-        splits = list(splits)
-        self.log(2, "Splits:", splits)
+        budgets = []  # the budget that ran out, if any
+        if self.max_candidates or self.max_depth or self.deadline:
+            splits = self.bounded_splits(word, budgets)
+        else:
+            splits = list(self.splits(word))
+            self.log(2, "Splits:", splits)
         # if not splits:  # in case we change the returning of unknown things
         #     return (word,) if output == "tuple" else word
+        best = self.choose(word, splits)
+        if budgets:
+            self.budget_stats[budgets[0]] += 1
+            self.log(2, "Degraded ({}): {}".format(budgets[0], word))
+            best = Degraded(best, budgets[0])
+        return best
+
+    def bounded_splits(self, word, budgets):
+        """
+        Yield the splits of a word, within the budgets for a word.
+
+        The budgets are --max-candidates splits, --max-depth parts per split
+        and --deadline milliseconds for yielding and cleaning the splits. Once
+        one runs out ("candidates", "depth" or "deadline"), its name is
+        appended to budgets, and the beam_width splits whose parts are the
+        most frequent (see beam_score) are yielded instead of the rest.
+        """
+        lattice = self.lattice(word)
+        deadline = self.deadline and perf_counter() + self.deadline
+        for count, split in enumerate(lattice.paths(self.max_depth), 1):
+            if self.max_candidates and count > self.max_candidates:
+                budgets.append("candidates")
+                break
+            if deadline and not count % 64 and perf_counter() > deadline:
+                budgets.append("deadline")
+                break
+            yield split
+        else:  # nobreak
+            if not lattice.pruned:
+                return
+            budgets.append("depth")
+        yield from lattice.beam(self.beam_score, self.beam_width, self.max_depth)
 
+    def beam_score(self, part):
+        """
+        Score a part by its frequency, weighted by its length.
+
+        Parts that would make the prefix or fragments cleanings drop the whole
+        split score lowest.
+        """
+        if part in self.prefixes and 'prefix' in self.cleanings:
+            return float('-inf')
+        if len(part) < 3 and part not in self.binding_set and 'fragments' in self.cleanings:
+            return float('-inf')
+        return len(part) * log0(self.words[part])
+
+    def choose(self, word, splits):
+        """Clean and rank the given splits of a word, returning the best."""
         clean = {*self.clean(splits)}
         self.log(2, "Cleaned:", clean)
-        rank = self.rank(clean)
-        self.log(2, "Ranked: ", rank)
+        if self.verbose >= 2:
+            self.log(2, "Ranked: ", self.rank(clean))
+        best = self.best(clean)
 
-        if rank:
-            best = rank[0]
-        else:
-            best = [(word,)]
+        if best is None:
+            best = (word,)
 
         self.log(2, "Best:", best)
 
-        return best[-1] if output == "tuple" else self.evalify(best[-1])
+        return best
+
+    def choose_reference(self, word, splits):
+        """
+        Like choose, but run the cleanings one after another and rank every
+        split by every ranking method, without preparing them (see --engine).
+        """
+        clean = {*wrap_functions([self.reference_method('clean_', method) for method in self.cleanings])(splits)}
+        self.similarities = {}
+        ranked = sorted(((*self.scores_reference(split), split) for split in clean), reverse=True)
+        if self.force_split:
+            ranked = [split for split in ranked if len(split[-1]) > 1]
+        return ranked[0][-1] if ranked else (word,)
+
+    def reference_method(self, kind, method):
+        """
+        Return the reference_ implementation of a clean_ or rank_ method (as
+        given by kind), or the method itself if it wasn't rewritten.
+        """
+        return getattr(self, 'reference_' + kind + method, None) or getattr(self, kind + method)
+
+    def scores(self, split):
+        """Return the scores of a split by every ranking method in turn."""
+        return tuple(getattr(self, 'rank_' + method)(split) for method in self.rankings)
+
+    def scores_reference(self, split):
+        """Like scores, but with the reference ranking methods."""
+        return tuple(self.reference_method('rank_', method)(split) for method in self.rankings)
 
     def rank(self, clean):
         """
@@ -246,9 +2188,14 @@ class Splitter(object):
         [(1024751378, 1.0, -2, ('kranken', 'haus')), (748127142, 1.0, -3, ('krank', 'en', 'haus')), ...]
 
         The scoring methods are defined by self.rankings, which was initialized
-        by command line or key word arguments.
+        by command line or key word arguments. If a method has a prepare_
+        counterpart, it is called once with all splits before scoring them.
 
         """
+        for method in self.rankings:
+            prepare_method = getattr(self, 'prepare_' + method, None)
+            if prepare_method is not None:
+                prepare_method(clean)
         ranked = []
         for split in clean:
             ranked.append((*(getattr(self, 'rank_' + method)(split) for method in self.rankings), split))
@@ -258,7 +2205,168 @@ class Splitter(object):
         else:
             return ranked
 
+    def best(self, clean):
+        """
+        Given an iterable of possible splits, return the one that would come
+        first in self.rank(clean) (or None), without ranking them all.
+
+        Each scoring method is only computed for the splits still tied for
+        first place by the methods before it, so expensive methods late in
+        self.rankings are rarely needed. self.ranking_stats counts the
+        scores computed and skipped.
+        """
+        candidates = [
+                split for split in clean
+                if not self.force_split or len(split) > 1
+                ]
+        total = len(candidates) * len(self.rankings)
+        for method in self.rankings:
+            if len(candidates) <= 1:
+                break
+            prepare = getattr(self, 'prepare_' + method, None)
+            if prepare is not None:
+                prepare(candidates)
+            scores = [*map(getattr(self, 'rank_' + method), candidates)]
+            self.ranking_stats['evaluated'] += len(scores)
+            total -= len(scores)
+            top = max(scores)
+            candidates = [split for split, score in zip(candidates, scores) if score == top]
+        self.ranking_stats['skipped'] += total
+        return max(candidates, default=None)
+
+    def compile_cleanings(self):
+        """
+        Return a function cleaning an iterable of splits like the chain of the
+        clean_ methods in self.cleanings would, in a single pass per split.
+
+        Every cleaning that has a cleaner_ counterpart (which cleans a single
+        split, returning None to drop it) is fused into one loop, and splits
+        that have been seen before at any stage are dropped right away, so
+        each distinct result is only produced once. With cleanings that lack
+        a cleaner_ method, or at verbosity 3 (to see every step), the chain
+        of clean_ methods is used instead.
+        """
+        stages = [getattr(self, 'cleaner_' + method, None) for method in self.cleanings]
+        if None in stages or self.verbose >= 3:
+            return wrap_functions([getattr(self, 'clean_' + method) for method in self.cleanings])
+
+        def clean(splits):
+            seen = [set() for _ in stages]
+            results = set()
+            for split in splits:
+                for stage, before in zip(stages, seen):
+                    if split in before:
+                        break
+                    before.add(split)
+                    split = stage(split)
+                    if split is None:
+                        break
+                else:  # nobreak
+                    if split not in results:
+                        results.add(split)
+                        yield split
+        return clean
+
+    def cleaner_general(self, split):
+        cleaned = []
+        i = 0
+        last = len(split)-1
+        while i <= last:
+            if split[i] in self.words:
+                cleaned.append(split[i])
+            elif i < len(split)-1 and split[i]+split[i+1] in self.words:
+                cleaned.append(split[i] + split[i+1])
+                i += 1
+            elif i == 0 and len(split)>1 and split[i] in self.binding_morphemes:
+                cleaned.append(split[i] + split[i+1])
+                i += 1
+            else:
+                cleaned.append(split[i])
+            i += 1
+        return tuple(cleaned)
+
     def clean_general(self, splits):
+        self.log(2, "Cleaning (general)")
+        for split in splits:
+            cleaned = self.cleaner_general(split)
+            self.log(3, "Made it through general:", cleaned)
+            yield cleaned
+
+    def cleaner_last_parts(self, split):
+        split = list(split)
+        while len(split[-1]) < 4 and len(split) >= 2:
+            split[-2] += split[-1]
+            del split[-1]
+        return tuple(split)
+
+    def clean_last_parts(self, splits):
+        self.log(2, "Cleaning (last parts)")
+        for split in splits:
+            split = self.cleaner_last_parts(split)
+            self.log(3, "Made it through last_parts:", split)
+            yield split
+
+    def starts_with_suffix(self, part):
+        """
+        Return whether part starts with a suffix at most 2 characters shorter.
+
+        Only the (up to three) prefixes of part that are long enough need to
+        be looked up, instead of checking every suffix.
+        """
+        return any(
+                part[:length] in self.suffixes
+                for length in range(max(len(part)-2, 0), len(part)+1)
+                )
+
+    def cleaner_suffix(self, split):
+        if self.inspect is not None and self.inspect == ''.join(split):
+            print("cleaning suffix of", split)
+        split = list(split)
+        while self.starts_with_suffix(split[-1]) and len(split) >= 2:
+            split[-2] += split[-1]
+            del split[-1]
+            if self.inspect is not None and self.inspect == ''.join(split):
+                print(split)
+        return tuple(split)
+
+    def clean_suffix(self, splits):
+        self.log(2, "Cleaning (suffix)")
+        for split in splits:
+            split = self.cleaner_suffix(split)
+            self.log(3, "Made it through suffix:", split)
+            yield split
+
+    def cleaner_prefix(self, split):
+        if any(part in self.prefixes for part in split):
+            return None
+        return split
+
+    def clean_prefix(self, splits):
+        self.log(2, "Cleaning (prefix)")
+        # self.log(3, "prefix-splitting", splits)
+        for split in splits:
+            # self.log(4, "> let's try", split)
+            if self.cleaner_prefix(split) is not None:
+                self.log(3, "Made it through prefix:", split)
+                yield split
+
+    def cleaner_fragments(self, split):
+        if any(len(part)<3 and part not in self.binding_set for part in split):
+            return None
+        return split
+
+    def clean_fragments(self, splits):
+        self.log(2, "Cleaning (fragments)")
+        for split in splits:
+            # self.log(4, "> let's try", split)
+            if self.cleaner_fragments(split) is not None:
+                self.log(3, "Made it through fragments:", split)
+                yield split
+
+    # The clean_ and rank_ methods as they were before they were rewritten for
+    # speed, used by the reference engine (see choose_reference)
+
+    def reference_clean_general(self, splits):
         self.log(2, "Cleaning (general)")
         for split in splits:
             cleaned = []
@@ -279,7 +2387,7 @@ class Splitter(object):
             self.log(3, "Made it through general:", cleaned)
             yield tuple(cleaned)
 
-    def clean_last_parts(self, splits):
+    def reference_clean_last_parts(self, splits):
         self.log(2, "Cleaning (last parts)")
         for split in splits:
             split = list(split)
@@ -289,7 +2397,7 @@ class Splitter(object):
             self.log(3, "Made it through last_parts:", split)
             yield tuple(split)
 
-    def clean_suffix(self, splits):
+    def reference_clean_suffix(self, splits):
         self.log(2, "Cleaning (suffix)")
         for split in splits:
             if self.inspect == ''.join(split):
@@ -303,27 +2411,27 @@ class Splitter(object):
             self.log(3, "Made it through suffix:", split)
             yield tuple(split)
 
-    def clean_prefix(self, splits):
+    def reference_clean_prefix(self, splits):
         self.log(2, "Cleaning (prefix)")
-        # self.log(3, "prefix-splitting", splits)
         for split in splits:
-            # self.log(4, "> let's try", split)
             if any(part in self.prefixes for part in split):
                 pass
             else:
                 self.log(3, "Made it through prefix:", split)
                 yield split
 
-    def clean_fragments(self, splits):
+    def reference_clean_fragments(self, splits):
         self.log(2, "Cleaning (fragments)")
         for split in splits:
-            # self.log(4, "> let's try", split)
             if any(len(part)<3 and part not in self.binding_morphemes for part in split):
                 pass
             else:
                 self.log(3, "Made it through fragments:", split)
                 yield split
 
+    def reference_rank_no_suffixes(self, split):
+       return 0 if any(part.startswith(suf) for part in split for suf in self.suffixes) else 1
+
     @staticmethod
     def nth_root(x, n):
         if n==2:
@@ -332,10 +2440,30 @@ class Splitter(object):
             return x**(1/n)
 
     def vecsim(self, left, right):
-        if self.vec is not None:
-            return self.vec.similarity(left[:6], right[:6])
-        else:
-            return 0
+        pair = left[:6], right[:6]
+        if pair in self.similarities:
+            if self.similarities[pair] is None:
+                raise KeyError(pair)
+            return self.similarities[pair]
+        return self.vec.similarity(*pair)
+
+    def prepare_semantic_similarity(self, splits):
+        """
+        Compute the similarities of all adjacent pairs in splits in one go.
+
+        This needs vectors that support it (see VectorStore.similarities) and
+        only pays off for more than a handful of pairs, below which vecsim
+        looks them up one by one. The results are kept in self.similarities
+        until the next call in the same thread.
+        """
+        self.similarities = {}
+        pairs = set()
+        for split in splits:
+            parts = [x[:6] for x in split if x not in self.binding_morphemes]
+            pairs.update(zip(parts, parts[1:]))
+        # without pairs, the vectors aren't needed (and maybe not read yet)
+        if len(pairs) >= self.min_batch_pairs and hasattr(self.vec, 'similarities'):
+            self.similarities = self.vec.similarities(pairs)
 
     def rank_avg_frequency(self, split):
         return reduce(add,
@@ -354,7 +2482,10 @@ class Splitter(object):
         return len(split)
 
     def rank_no_suffixes(self, split):
-       return 0 if any(part.startswith(suf) for part in split for suf in self.suffixes) else 1
+       return 0 if any(
+               part[:length] in self.suffixes
+               for part in split for length in range(len(part)+1)
+               ) else 1
 
     def rank_shortest(self, split):
         return -len(split)
@@ -397,60 +2528,62 @@ class Splitter(object):
             result += ("|" if part in self.binding_morphemes else "+") + part
         return result[1:]
 
-    def evaluate(self, gold_file):
-        """
-        Given an annotated compound list, return performance statistics.
-        """
-        judgements = Counter()
-        error_analysis = Counter()
+    @staticmethod
+    def read_gold(gold_file):
+        """Yield (word, annotation) pairs from an annotated compound list."""
         with open(gold_file) as f:
             for line in f:
-                for line in f:
-                    try:
-                        original, gold = line.lower().strip().split()
-                    except Exception as e:
-                        print(line)
-                        raise e
-                    result = self.split(original, output="eval")
-                    # ignore endings:
-                    if "+" in gold and "+" in result:
-                        gold = gold.rsplit("+", 1)[0] + "+"
-                        result = result.rsplit("+", 1)[0] + "+"
-                    # count linking morphemes as part-suffixes
-                    gold = gold.replace("|", "")
-                    gold = gold.replace("(", "")
-                    gold = gold.replace(")", "")
-                    result = result.replace("|", "")
-                    # error analysis:
-                    if result.count("+") < gold.count("+"):
-                        error_analysis['under'] += 1
-                    elif result.count("+") > gold.count("+"):
-                        error_analysis['over'] += 1
-                        ... #over
-                    # judgements:
-                    if "+" not in gold:  # not a compound
-                        if gold == result:
-                            judgements['true negative'] += 1
-                        elif "+" in result:  # we think it's a compound
-                            judgements['false positive'] += 1
-                            if self.print_wrong:
-                                print(original, gold, result)
-                        else:
-                            print(original, gold, result)
-                            raise RuntimeError("true negative, but still different?")
-                    else:  # compound
-                        if gold == result:
-                            judgements['true positive'] += 1
-                        elif "+" not in result:
-                            judgements['false negative'] += 1
-                            if self.print_wrong:
-                                print(original, gold, result)
-                        else:
-                            judgements['incorrectly split'] += 1
-                            error_analysis['wrong'] += 1
-                            if self.print_wrong:
-                                print(original, gold, result)
+                try:
+                    original, gold = line.lower().strip().split()
+                except Exception as e:
+                    print(line)
+                    raise e
+                yield original, gold
 
+    def judge(self, original, gold, result, judgements, error_analysis, print_wrong=False):
+        """Compare a result to its annotation, updating the given Counters."""
+        # ignore endings:
+        if "+" in gold and "+" in result:
+            gold = gold.rsplit("+", 1)[0] + "+"
+            result = result.rsplit("+", 1)[0] + "+"
+        # count linking morphemes as part-suffixes
+        gold = gold.replace("|", "")
+        gold = gold.replace("(", "")
+        gold = gold.replace(")", "")
+        result = result.replace("|", "")
+        # error analysis:
+        if result.count("+") < gold.count("+"):
+            error_analysis['under'] += 1
+        elif result.count("+") > gold.count("+"):
+            error_analysis['over'] += 1
+            ... #over
+        # judgements:
+        if "+" not in gold:  # not a compound
+            if gold == result:
+                judgements['true negative'] += 1
+            elif "+" in result:  # we think it's a compound
+                judgements['false positive'] += 1
+                if print_wrong:
+                    print(original, gold, result)
+            else:
+                print(original, gold, result)
+                raise RuntimeError("true negative, but still different?")
+        else:  # compound
+            if gold == result:
+                judgements['true positive'] += 1
+            elif "+" not in result:
+                judgements['false negative'] += 1
+                if print_wrong:
+                    print(original, gold, result)
+            else:
+                judgements['incorrectly split'] += 1
+                error_analysis['wrong'] += 1
+                if print_wrong:
+                    print(original, gold, result)
+
+    @staticmethod
+    def performance(judgements):
+        """Return precision, recall, accuracy, F-measure and coverage."""
         try:
             precision = (judgements['true positive']
                     / (judgements['true positive']
@@ -474,21 +2607,334 @@ class Splitter(object):
         quasi_f = 2*((precision*recall)/(precision+recall))
         coverage = ((judgements['true positive'] + judgements['incorrectly split'])
                    /(judgements['true positive'] + judgements['incorrectly split'] + judgements['false negative']))
-        return precision, recall, accuracy, quasi_f, coverage, error_analysis
+        return precision, recall, accuracy, quasi_f, coverage
+
+    def evaluate(self, gold_file):
+        """
+        Given an annotated compound list, return performance statistics.
+        """
+        judgements = Counter()
+        error_analysis = Counter()
+        for original, gold in self.read_gold(gold_file):
+            result = self.split(original, output="eval")
+            self.judge(original, gold, result, judgements, error_analysis, self.print_wrong)
+        return (*self.performance(judgements), error_analysis)
+
+    def evaluate_candidates(self, gold, rankings, cleanings):
+        """
+        Like evaluate, but for a list of (word, annotation, splits) triples
+        and the given ranking and cleaning methods.
+        """
+        previous = self.rankings, self.cleanings
+        self.configure(rankings, cleanings)
+        try:
+            judgements = Counter()
+            error_analysis = Counter()
+            for original, annotation, splits in gold:
+                result = self.evalify(self.choose(original, splits))
+                self.judge(original, annotation, result, judgements, error_analysis)
+        finally:
+            self.configure(*previous)
+        return (*self.performance(judgements), error_analysis)
+
+    def verify(self, words):
+        """
+        Split words with this Splitter's engine and the reference engine.
+
+        The reference engine runs in a Splitter of its own, which parses the
+        text lexicon into dicts instead of using a compiled or compact one.
+
+        Return the (word, reference split, split) triples of the words that
+        they split differently, and the words per second of either engine.
+        """
+        words = [*words]
+        if self.engine == 'reference':
+            reference = self
+        else:
+            reference = type(self)(
+                    language=self.lang,
+                    verbose=self.verbose,
+                    args=dict(self.args, **{'--engine': 'reference'}),
+                    )
+            reference.configure(self.rankings, self.cleanings)
+        results = {}
+        throughput = {}
+        for engine, split in (('reference', reference.split_reference), (self.engine, self.split)):
+            start = perf_counter()
+            results[engine] = [split(word) for word in words]
+            throughput[engine] = len(words) / max(perf_counter() - start, 1e-9)
+        differences = {
+                word.lower(): (word.lower(), reference, split)
+                for word, reference, split in zip(words, results['reference'], results[self.engine])
+                if reference != split
+                }
+        return [*differences.values()], throughput
+
+    def gold_candidates(self, gold_file):
+        """Return (word, annotation, candidate splits) for every word of a gold file."""
+        return [
+                (original, annotation, [*self.splits(original)])
+                for original, annotation in self.read_gold(gold_file)
+                ]
+
+    def sweep(self, gold_file, configurations, *, workers=None):
+        """
+        Evaluate several configurations on an annotated compound list.
+
+        configurations is a list of (rankings, cleanings) pairs. Since splits
+        doesn't depend on them, the candidates of every word are only
+        computed once; the configurations are then evaluated in parallel by
+        up to workers processes (see worker_pool), which inherit the
+        candidates rather than getting a copy for every configuration.
+        Returns a list of (rankings, cleanings, *evaluate()) tuples in the
+        same order.
+        """
+        global worker_gold
+        gold = self.gold_candidates(gold_file)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(configurations))
+        if workers <= 1:
+            results = [self.evaluate_candidates(gold, *config) for config in configurations]
+        else:
+            worker_gold = gold
+            try:
+                with self.worker_pool(workers) as pool:
+                    results = pool.starmap(
+                            evaluate_in_worker,
+                            [(gold_file, *config) for config in configurations],
+                            )
+            finally:
+                worker_gold = None
+        return [(*config, *result) for config, result in zip(configurations, results)]
+
+
+class Registry(object):
+    """
+    Splitters for several languages, each loaded when it is first used.
+
+    All of them are created with the same args, so only the language differs,
+    except for --delta: a path holding "{lang}" is used for every language,
+    with the language filled in, and any other path only for the default
+    language (see language_args). A language is loaded once, however many
+    callers (or threads) ask for it, and the Splitter is then shared between
+    them. Languages without a Splitter (see BINDING_MORPHEMES) are not in the
+    registry.
+    """
+    def __init__(self, default="de", *, verbose=False, args, cls=None, frozen=False):
+        self.default = default  # the language of words that don't say
+        self.verbose = verbose
+        self.args = args
+        self.cls = cls or Splitter
+        self.frozen = frozen  # whether to freeze the Splitters (see Splitter.freeze)
+        self.splitters = {}  # language -> loaded Splitter
+        self.lock = threading.Lock()
+        self.loading = {}  # language -> lock held while loading it
+
+    def __contains__(self, language):
+        return language in BINDING_MORPHEMES
+
+    def __getitem__(self, language):
+        """Return the Splitter for a language, loading it if needed."""
+        spl = self.splitters.get(language)
+        if spl is not None:
+            return spl
+        if language not in self:
+            raise KeyError(language)
+        with self.lock:
+            lock = self.loading.setdefault(language, threading.Lock())
+        with lock:
+            spl = self.splitters.get(language)
+            if spl is None:
+                spl = self.cls(language=language, verbose=self.verbose, args=self.language_args(language))
+                if self.frozen:
+                    spl.freeze()
+                self.splitters[language] = spl
+        return spl
+
+    def language_args(self, language):
+        """Return the args to create the Splitter of a language with."""
+        delta = self.args.get('--delta')
+        if delta is None or language == self.default or '{lang}' in delta:
+            return self.args
+        return dict(self.args, **{'--delta': None})
+
+    def split(self, language, word, *, output="tuple"):
+        """Split a word of the given language (None for the default one)."""
+        return self[language or self.default].split(word, output=output)
+
+    def worker_pool(self, workers, *, threads=False):
+        """
+        Return a multiprocessing pool whose workers can use split_pairs.
+
+        Like Splitter.worker_pool, the workers are forked from this process
+        where possible, sharing the languages loaded so far. Either way, each
+        worker loads any other language itself when it is first used. With
+        threads, the workers are threads sharing this registry.
+        """
+        import multiprocessing.pool
+        global worker_registry
+        if threads:
+            return multiprocessing.pool.ThreadPool(workers)
+        if "fork" in multiprocessing.get_all_start_methods():
+            for spl in self.splitters.values():
+                if 'semantic_similarity' in spl.rankings:
+                    spl.load_vectors()
+            worker_registry = self
+            gc.freeze()
+            try:
+                return multiprocessing.get_context("fork").Pool(workers)
+            finally:
+                gc.unfreeze()
+        return multiprocessing.Pool(
+                workers,
+                initializer=init_registry_worker,
+                initargs=(self.cls, self.default, self.verbose, self.args),
+                )
+
+    def split_many(self, pairs, *, workers=None, threads=False, chunksize=256, output="tuple"):
+        """
+        Split an iterable of (language, word) pairs, yielding the results in
+        input order, like Splitter.split_many.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for language, word in pairs:
+                yield self.split(language, word, output=output)
+            return
+        with self.worker_pool(workers, threads=threads) as pool:
+            yield from map_chunks(
+                    pool,
+                    self.split_list if threads else split_pairs,
+                    pairs,
+                    workers=workers,
+                    chunksize=chunksize,
+                    output=output,
+                    )
+
+    def split_list(self, pairs, output="tuple"):
+        """Split a list of (language, word) pairs, returning a list."""
+        return [self.split(language, word, output=output) for language, word in pairs]
 
 if __name__ == '__main__':
-    if version_info < (3, 5):
-        print("Error: Python >=3.5 required.", file=sys.stderr)
+    imported = perf_counter()
+    import docopt
+    if version_info < (3, 7):
+        print("Error: Python >=3.7 required.", file=sys.stderr)
         exit(1)
     args = docopt.docopt(__doc__)
-    spl = Splitter(language=args['--lang'], verbose=args['--verbose'], args=args)
-    if args['--evaluate']:
+    startup = Stats()
+    startup.add('import', imported - started)
+    startup.add('docopt', perf_counter() - imported)
+    workers = int(args['--workers']) or os.cpu_count() or 1
+    if args['--sweep']:
+        rankings = (args['--ranking'] or "semantic_similarity,shortest").split(";")
+        cleanings = (args['--cleaning'] or "general,last_parts,prefix,fragments,suffix").split(";")
+        args['--ranking'], args['--cleaning'] = rankings[0], cleanings[0]
+    if not args['--compiled']:
+        # compiled lexica start fast but split slowly, which only pays off for short calls
+        args['--compiled'] = not (args['--no-compiled'] or args['--serve'] or args['--stream']
+                                  or args['--precompute'])
+    registry = Registry(
+            args['--lang'],
+            verbose=args['--verbose'],
+            args=args,
+            # threads share the Splitters; a server applies --delta between
+            # batches though, while none of them splits
+            frozen=args['--threads'] and (args['--stream'] or args['--serve'] and not args['--delta']),
+            )
+    if args['--stream'] and args['--lang-column'] is not None:
+        spl = None  # languages are loaded as they occur
+    else:
+        loading = perf_counter()
+        spl = registry[args['--lang']]
+        startup.add('load', perf_counter() - loading)
+    if args['--compile-lexicon']:
+        print(spl.compile_lexicon())
+    elif args['--precompute']:
+        print(spl.precompute(
+            (line.split(None, 1)[0] for line in read_lines(args['<file>']) if line.strip()),
+            workers=workers,
+            ))
+    elif args['--serve']:
+        server = SplitServer(
+                spl,
+                workers=workers,
+                threads=args['--threads'],
+                batch_size=int(args['--batch-size']),
+                batch_wait=int(args['--batch-wait']) / 1000,
+                )
+        import asyncio
+        try:
+            asyncio.run(server.serve(args['--host'], int(args['--port'])))
+        except KeyboardInterrupt:
+            pass
+    elif args['--verify']:
+        differences, throughput = spl.verify(
+            line.split(None, 1)[0] for line in read_lines(args['<file>']) if line.strip()
+            )
+        for word, reference, split in differences:
+            print(
+                    word,
+                    spl.evalify(reference),
+                    spl.evalify(split),
+                    spl.scores(reference),
+                    spl.scores(split),
+                    sep="\t",
+                    )
+        for engine, words_per_second in throughput.items():
+            print("{}: {:.0f} words/s".format(engine, words_per_second), file=stderr)
+        print(len(differences), "words split differently", file=stderr)
+        if differences:
+            exit(1)
+    elif args['--evaluate'] and args['--sweep']:
+        L = lambda x: int(round(x+0.001, 2)*100)
+        configurations = [
+                (ranking.split(","), [x for x in cleaning.split(",") if x])
+                for ranking in rankings for cleaning in cleanings
+                ]
+        print("ranking", "cleaning", "P", "R", "A", "F", "C", sep="\t")
+        for ranking, cleaning, *result, E in spl.sweep(
+                args['<file>'][0],
+                configurations,
+                workers=workers,
+                ):
+            print(",".join(ranking), ",".join(cleaning), *(".{}".format(L(x)) for x in result), sep="\t")
+    elif args['--evaluate']:
         # Fix rounding to make 2.345 mean 2.35
         L = lambda x: int(round(x+0.001, 2)*100)
         p, r, a, f, c, E = spl.evaluate(args['<file>'][0])
         print(".{} .{} .{} .{} .{}".format(*map(L, (p, r, a, f, c))), E)
+    elif args['--stream']:
+        with open(stdout.fileno(), "w", buffering=1 << 20, closefd=False) as out:
+            split_stream(
+                    registry if spl is None else spl,
+                    read_lines(args['<file>']),
+                    out,
+                    column=int(args['--column']),
+                    lang_column=None if spl is not None else int(args['--lang-column']),
+                    window=int(args['--window']),
+                    workers=workers,
+                    threads=args['--threads'],
+                    )
+        for spl in registry.splitters.values():
+            spl.log(1, "Cache ({}):".format(spl.lang), spl.cache.stats())
+            spl.log(1, "Ranking ({}):".format(spl.lang), spl.ranking_stats)
+            spl.log(1, "Budgets ({}):".format(spl.lang), spl.budget_stats)
     else:
         for line in fileinput(args['<file>']):
             if not line.strip():
                 break
             print(line.strip(), spl.split(line.strip(), output="eval"), sep="\t")
+        spl.log(1, "Cache:", spl.cache.stats())
+        spl.log(1, "Ranking:", spl.ranking_stats)
+        spl.log(1, "Budgets:", spl.budget_stats)
+    for spl in registry.splitters.values():
+        if spl.stats is not None:
+            print(spl.stats.report(), file=stderr)
+    if args['--profile-startup']:
+        startup.add('total', perf_counter() - started)
+        print(startup.report(), file=stderr)
+        for spl in registry.splitters.values():
+            print("Startup ({}):".format(spl.lang), spl.startup.report(), sep="\n", file=stderr)
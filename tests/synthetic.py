@@ -0,0 +1,54 @@
+"""
+Synthetic lexica and vectors for the tests.
+
+The real lexica are not part of the repository, so like utils/benchmark.py,
+the tests generate a small lexicon for each language from the gold corpus,
+along with random vectors for its words, in a temporary directory.
+"""
+import os
+import sys
+import random
+import shutil
+import tempfile
+
+import numpy
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "utils"))
+import splitter  # noqa: E402
+from benchmark import gold_words, synthetic_lexicon  # noqa: E402
+from export_vectors import export  # noqa: E402
+
+SIZE = 20000  # entries per lexicon
+DIMENSIONS = 16
+
+
+def lexicon_dir(langs=("de", "sv", "hu"), *, size=SIZE, seed=0):
+    """Return a new temporary directory holding a lexicon and vectors per language."""
+    directory = tempfile.mkdtemp(prefix="splitter-test-")
+    rng = random.Random(seed)
+    for lang in langs:
+        for name in ("stopwords", "suffixes", "prefixes"):
+            shutil.copy(os.path.join(splitter.Splitter.lexicon_dir, lang + "." + name + ".txt"), directory)
+        _, parts = gold_words(lang)
+        lexicon = synthetic_lexicon(parts, size, rng)
+        with open(os.path.join(directory, lang + ".lexicon.tsv"), "w") as f:
+            f.writelines("{}\t{}\n".format(word, count) for word, count in lexicon)
+        prefixes = [*dict.fromkeys(word[:6] for word, _ in lexicon)]
+        vectors = numpy.random.RandomState(seed).standard_normal((len(prefixes), DIMENSIONS))
+        export(prefixes, vectors, os.path.join(directory, lang + ".vectors"))
+    return directory
+
+
+def splitter_class(directory):
+    """Return a Splitter class reading its lexica from directory."""
+    class Splitter(splitter.Splitter):
+        lexicon_dir = directory
+    return Splitter
+
+
+def args(*options):
+    """Return the args of a Splitter for a command line (see splitter.py)."""
+    import docopt
+    return docopt.docopt(splitter.__doc__, [*options])
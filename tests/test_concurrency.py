@@ -0,0 +1,72 @@
+"""
+Stress tests of a frozen Splitter shared between threads.
+
+Threads are switched as often as possible, and the splits of every thread
+have to be the same as those of a single thread.
+
+Run with: python3 -m unittest discover tests
+"""
+import sys
+import random
+import shutil
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import synthetic
+
+THREADS = 8
+WORDS = 1000  # gold words per language
+LOOKUPS = 20000  # splits per language, spread over the threads
+
+
+def setUpModule():
+    global directory, Splitter
+    directory = synthetic.lexicon_dir()
+    Splitter = synthetic.splitter_class(directory)
+
+def tearDownModule():
+    shutil.rmtree(directory)
+
+
+class ConcurrencyTest(unittest.TestCase):
+    def setUp(self):
+        self.switchinterval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switchinterval)
+
+    def check(self, lang, ranking):
+        words = synthetic.gold_words(lang)[0][:WORDS]
+        args = synthetic.args('-L', lang, '--ranking=' + ranking, '--cache-size=0', 'x')
+        expected = [*map(Splitter(language=lang, args=args).split, words)]
+        # a tiny cache, so that it is written to and evicted from all the time
+        args['--cache-size'] = '50'
+        spl = Splitter(language=lang, args=args).freeze()
+        rng = random.Random(0)
+        order = [rng.randrange(len(words)) for _ in range(LOOKUPS)]
+
+        with ThreadPoolExecutor(THREADS) as pool:
+            splits = [*pool.map(lambda i: spl.split(words[i]), order)]
+        self.assertEqual(splits, [expected[i] for i in order])
+
+        splits = spl.split_many((words[i] for i in order), workers=THREADS, threads=True, chunksize=16)
+        self.assertEqual([*splits], [expected[i] for i in order])
+
+        with self.assertRaises(RuntimeError):
+            spl.update_counts({"haus": 5})
+        with self.assertRaises(RuntimeError):
+            spl.configure(rankings=['shortest'])
+
+    def test_de(self):
+        self.check('de', 'most_known,semantic_similarity,shortest')
+
+    def test_sv(self):
+        self.check('sv', 'most_known,avg_frequency,shortest')
+
+    def test_hu(self):
+        self.check('hu', 'semantic_similarity,avg_frequency,shortest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Tests of server mode against a SplitServer on localhost.
+
+Run with: python3 -m unittest discover tests
+"""
+import os
+import json
+import shutil
+import socket
+import asyncio
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+import splitter
+import synthetic
+
+
+def setUpModule():
+    global directory, Splitter
+    directory = synthetic.lexicon_dir(["de"])
+    Splitter = synthetic.splitter_class(directory)
+
+def tearDownModule():
+    shutil.rmtree(directory)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerTest(unittest.TestCase):
+    workers = 1
+
+    def arguments(self):
+        return ['-L', 'de', '--ranking=most_known,semantic_similarity,shortest', '--serve']
+
+    def setUp(self):
+        self.spl = Splitter(language='de', args=synthetic.args(*self.arguments()))
+        self.port = free_port()
+        self.server = splitter.SplitServer(self.spl, workers=self.workers)
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),), daemon=True)
+        self.thread.start()
+        for _ in range(100):
+            try:
+                self.request("/health")
+                break
+            except OSError:
+                threading.Event().wait(0.05)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        try:
+            await self.server.serve("127.0.0.1", self.port)
+        except asyncio.CancelledError:
+            pass
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join()
+
+    def request(self, path, body=None):
+        """Return the status and JSON response of a request."""
+        url = "http://127.0.0.1:{}{}".format(self.port, path)
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        try:
+            with urllib.request.urlopen(url, data, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_split(self):
+        words = ["Krankenhaus", "bundesgericht", "haus"]
+        status, response = self.request("/split", {"words": words})
+        self.assertEqual(status, 200)
+        self.assertEqual(response["splits"], [[*self.spl.split(word)] for word in words])
+
+    def test_empty(self):
+        self.assertEqual(self.request("/split", {"words": []}), (200, {"splits": []}))
+
+    def test_errors(self):
+        self.assertEqual(self.request("/split", {"word": "haus"})[0], 400)
+        self.assertEqual(self.request("/nothing")[0], 404)
+        self.assertEqual(self.request("/split")[0], 405)
+
+    def test_too_large(self):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=10) as s:
+            # no body follows, so this only gets an answer if it isn't read
+            s.sendall(b"POST /split HTTP/1.1\r\nContent-Length: 1000000000\r\n\r\n")
+            response = s.makefile("rb").read()
+        self.assertTrue(response.startswith(b"HTTP/1.1 413 "))
+        self.assertIn(b"Connection: close", response)
+        self.assertEqual(self.request("/health"), (200, {"status": "ok"}))
+
+
+class PoolServerTest(ServerTest):
+    workers = 2
+
+
+class DeltaServerTest(ServerTest):
+    def arguments(self):
+        self.delta = os.path.join(directory, "delta.tsv")
+        open(self.delta, "w").close()
+        return super().arguments() + ['--delta=' + self.delta]
+
+    def setUp(self):
+        super().setUp()
+        self.server.reload_interval = 0
+
+    def tearDown(self):
+        super().tearDown()
+        os.remove(self.delta)
+
+    def write_delta(self, text):
+        mtime = os.stat(self.delta).st_mtime_ns
+        with open(self.delta, "w") as f:
+            f.write(text)
+        os.utime(self.delta, ns=(mtime + 10**9, mtime + 10**9))  # however coarse the clock
+
+    def test_delta(self):
+        word = "zorbelquastfimmel"
+        self.assertEqual(self.request("/split", {"words": [word]}), (200, {"splits": [[word]]}))
+
+        self.write_delta("zorbel\t100000\nkaputt\n")
+        self.assertEqual(self.request("/split", {"words": [word]}), (200, {"splits": [[word]]}))
+        self.assertEqual(self.request("/metrics")[1]["reload_errors"], 1)
+        self.assertEqual(self.request("/health"), (200, {"status": "ok"}))
+
+        self.write_delta("zorbel\t100000\nquastfimmel\t100000\n")
+        status, response = self.request("/split", {"words": [word]})
+        self.assertEqual(response["splits"], [["zorbel", "quastfimmel"]])
+        self.assertEqual(self.request("/metrics")[1]["reloads"], 1)
+
+
+class FailingServerTest(ServerTest):
+    def setUp(self):
+        super().setUp()
+
+        def split(word, **kwargs):
+            raise RuntimeError(word)
+        self.spl.split = split
+
+    def test_split(self):
+        status, response = self.request("/split", {"words": ["haus"]})
+        self.assertEqual(status, 500)
+        self.assertIn("error", response)
+        self.assertEqual(self.request("/health"), (200, {"status": "ok"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
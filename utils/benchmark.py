@@ -0,0 +1,222 @@
+"""
+Benchmark the splitter on synthetic lexica.
+
+Usage:
+    benchmark.py [options]
+
+Options:
+    --help                  Display this help and exit.
+    -L --langs=<...>        Comma-separated languages to benchmark [default: de,sv,hu].
+    -n --size=<n>           Entries in each synthetic lexicon [default: 125000].
+    --compounds=<n>         Long compounds to generate per language [default: 1000].
+    --ranking=<...>         Ranking methods to use [default: most_known,avg_frequency,shortest].
+    --cleaning=<...>        Cleaning methods to use.
+    --compiled              Benchmark with a compiled lexicon.
+    --compact               Benchmark with a compact lexicon.
+    --seed=<n>              Random seed for the synthetic data [default: 0].
+    -o --output=<file>      Write the results to this JSON file.
+    --baseline=<file>       Compare the results to an earlier JSON file.
+    --threshold=<x>         Allowed relative regression against the baseline [default: 0.1].
+
+The real lexica are not part of the repository, so for each language a
+lexicon of --size entries is generated: the parts of the annotated words in
+gold_corpus/ come first, followed by made-up words built from their syllables,
+with Zipf-distributed frequencies. The words of the gold corpus and
+--compounds generated long compounds are then split, one language per process
+so that their peak memory can be measured separately.
+
+For every language, the startup time, throughput, latency percentiles by word
+length, numbers of candidates produced by splits and the peak RSS are
+reported. With --baseline, the script exits with status 1 if the throughput,
+the p99 latency or the startup time got worse by more than --threshold.
+"""
+import os
+import re
+import sys
+import json
+import random
+import shutil
+import tempfile
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import docopt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import splitter  # noqa: E402
+
+# word lengths are bucketed like this for the latency percentiles
+BUCKETS = ((1, 8), (9, 16), (17, 24), (25, 40), (41, None))
+
+
+def gold_words(lang):
+    """Return the words and the parts of their annotations in the gold corpus."""
+    words, parts = [], []
+    with open(os.path.join(ROOT, "gold_corpus", "candidates." + lang + ".txt")) as f:
+        for line in f:
+            fields = line.lower().split()
+            if len(fields) < 2:
+                continue
+            words.append(fields[0])
+            parts.extend(part for part in re.split(r"[+|()]", fields[1]) if part)
+    return words, parts
+
+
+def synthetic_lexicon(parts, size, rng):
+    """Return size (word, count) pairs, most frequent first."""
+    stems = [*dict.fromkeys(part for part in parts if len(part) >= 4)]
+    syllables = sorted({stem[i:i+n] for stem in stems for n in (2, 3) for i in range(0, len(stem)-n+1, n)})
+    lexicon = dict.fromkeys(stems)
+    while len(lexicon) < size:
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 5)))
+        if len(word) >= 4:
+            lexicon[word] = None
+    return [(word, max(2, 10**7 // rank)) for rank, word in enumerate([*lexicon][:size], 1)]
+
+
+def long_compounds(words, morphemes, count, rng):
+    """Make up count compounds of 3 to 6 words, glued with binding morphemes."""
+    compounds = []
+    for _ in range(count):
+        parts = [rng.choice(words) for _ in range(rng.randint(3, 6))]
+        compounds.append("".join(
+            part + (rng.choice(morphemes) if rng.random() < 0.3 else "")
+            for part in parts
+            ))
+    return compounds
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values)-1, int(p / 100 * len(values)))]
+
+
+def bucket(word):
+    for lo, hi in BUCKETS:
+        if hi is None or len(word) <= hi:
+            return lo, hi
+
+
+def benchmark(lang, args):
+    """Benchmark one language; meant to run in a fresh process."""
+    rng = random.Random(int(args['--seed']))
+    words, parts = gold_words(lang)
+    lexicon = synthetic_lexicon(parts, int(args['--size']), rng)
+    directory = tempfile.mkdtemp(prefix="splitter-bench-")
+    try:
+        for name in ("stopwords", "suffixes", "prefixes"):
+            shutil.copy(os.path.join(splitter.Splitter.lexicon_dir, lang + "." + name + ".txt"), directory)
+        with open(os.path.join(directory, lang + ".lexicon.tsv"), "w") as f:
+            f.writelines("{}\t{}\n".format(word, count) for word, count in lexicon)
+
+        class Splitter(splitter.Splitter):
+            lexicon_dir = directory
+
+        options = docopt.docopt(splitter.__doc__, [
+                '--lang=' + lang, '--limit=' + args['--size'], '--ranking=' + args['--ranking'],
+                '--cache-size=0',
+                *(['--cleaning=' + args['--cleaning']] if args['--cleaning'] else []),
+                *(['--compact'] if args['--compact'] else []),
+                *(['--compiled'] if args['--compiled'] else []),
+                '-',
+                ])
+        if args['--compiled']:
+            # compile in a child, so that parsing doesn't count towards our RSS
+            child = multiprocessing.get_context("fork").Process(
+                    target=lambda: Splitter(language=lang, args=options).compile_lexicon())
+            child.start()
+            child.join()
+        start = perf_counter()
+        spl = Splitter(language=lang, args=options)
+        startup = perf_counter() - start
+
+        words += long_compounds(
+                [word for word, _ in lexicon[:10000]],
+                spl.binding_morphemes,
+                int(args['--compounds']),
+                rng,
+                )
+        latencies = {}
+        candidates = []
+        start = perf_counter()
+        for word in words:
+            before = perf_counter()
+            spl.split(word)
+            latencies.setdefault(bucket(word), []).append(perf_counter() - before)
+        elapsed = perf_counter() - start
+        for word in words:
+            candidates.append(sum(1 for _ in spl.splits(word)))
+    finally:
+        shutil.rmtree(directory)
+    everything = [t for bucket_latencies in latencies.values() for t in bucket_latencies]
+    return {
+            'words': len(words),
+            'lexicon': len(lexicon),
+            'startup': startup,
+            'words_per_second': len(words) / elapsed,
+            'p50': percentile(everything, 50),
+            'p99': percentile(everything, 99),
+            'latency_by_length': {
+                "{}-{}".format(lo, hi or ""): {
+                    'words': len(latencies[lo, hi]),
+                    'p50': percentile(latencies[lo, hi], 50),
+                    'p99': percentile(latencies[lo, hi], 99),
+                    }
+                for lo, hi in BUCKETS if (lo, hi) in latencies
+                },
+            'candidates': {
+                'mean': sum(candidates) / len(candidates),
+                'p99': percentile(candidates, 99),
+                'max': max(candidates),
+                },
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+
+
+def regressions(results, baseline, threshold):
+    """Yield a message for every metric that got worse than the baseline allows."""
+    for lang, result in results.items():
+        if lang not in baseline:
+            continue
+        old = baseline[lang]
+        if result['words_per_second'] < old['words_per_second'] * (1 - threshold):
+            yield "{}: throughput {:.0f} < {:.0f} words/s".format(
+                    lang, result['words_per_second'], old['words_per_second'])
+        for metric in ('p99', 'startup'):
+            if result[metric] > old[metric] * (1 + threshold):
+                yield "{}: {} {:.6f}s > {:.6f}s".format(lang, metric, result[metric], old[metric])
+
+
+if __name__ == '__main__':
+    args = docopt.docopt(__doc__)
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for lang in args['--langs'].split(","):
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            results[lang] = pool.submit(benchmark, lang, args).result()
+        result = results[lang]
+        print(
+                "{}: {} words, startup {:.3f}s, {:.0f} words/s, p50 {:.2f}ms, p99 {:.2f}ms, "
+                "{:.1f} candidates on average, peak RSS {:.0f} MB".format(
+                    lang, result['words'], result['startup'], result['words_per_second'],
+                    result['p50'] * 1000, result['p99'] * 1000,
+                    result['candidates']['mean'], result['peak_rss_kb'] / 1024,
+                    ),
+                file=sys.stderr,
+                )
+    if args['--output']:
+        with open(args['--output'], "w") as f:
+            json.dump(results, f, indent=2)
+    if args['--baseline']:
+        with open(args['--baseline']) as f:
+            baseline = json.load(f)
+        failures = [*regressions(results, baseline, float(args['--threshold']))]
+        for failure in failures:
+            print("Regression:", failure, file=sys.stderr)
+        if failures:
+            sys.exit(1)
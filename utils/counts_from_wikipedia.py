@@ -1,15 +1,55 @@
-import fileinput
-import sys
+"""
+Count the words of Wikipedia XML dumps into a lexicon.
+
+Usage:
+    counts_from_wikipedia.py [options] [<dump>...]
+
+Options:
+    --help                  Display this help and exit.
+    -j --workers=<n>        Number of counting processes (default: one per CPU).
+    --chunk-size=<mb>       Size of the pieces the dumps are counted in [default: 64].
+    --max-words=<n>         Distinct words to hold in memory before spilling [default: 2000000].
+    --tmp=<dir>             Where to spill partial counts (default: the system's).
+    --min-count=<n>         Leave out words counted less often [default: 1].
+    -o --output=<file>      Write the counts to this file instead of stdout.
+    --compile=<lang>        Write the counts to lex/<lang>.lexicon.tsv instead, and
+                            compile it for the splitter.
+    -l --limit=<n>          With --compile, the --limit to compile for [default: 125000].
+
+Dumps may be compressed with bzip2 or gzip (multistream dumps work, too); with
+no dumps given, one is read from stdin. They are cut into pieces of about
+--chunk-size MB at page boundaries, whose words are counted by --workers
+processes. Whenever more than --max-words distinct words have been counted,
+the counts are sorted and spilled to a file in --tmp, and the spilled files are
+merged in the end, so memory stays bounded however large the dumps are.
+
+The result has a word and its count per line, separated by a tab, most
+frequent first, which is what the splitter reads as lex/<lang>.lexicon.tsv.
+"""
+import io
+import os
 import re  # I wish I could use regex instead
+import sys
+import bz2
+import gzip
+import heapq
+import tempfile
+import multiprocessing
 from html import unescape
+from itertools import groupby
 from collections import Counter
+from operator import itemgetter
+
+import docopt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import splitter  # noqa: E402
 
 def log(*a, **k):
     print(*a, **k, file=sys.stderr)
 
 
-counts = Counter()
-INSIDE=False
 starters = {'}}',
         '{{',
         '|',
@@ -31,33 +71,185 @@ wikilink = re.compile(r'\[\[(?:[^\]]*?\|)?([^|\]]*?)\]\]')
 template = re.compile(r'{{[^}]+?}}')
 
 
-def count(line):
-    for w in word.findall(line):
-        counts[w.lower()] += 1
-
-def cprint(line):
+def clean(line):
+    """Return the text of a line of wiki markup, or None to skip it."""
     line = unescape(unescape(line).replace('<text xml:space="preserve">', ''))
     line = line.strip().replace("'''", '').replace("''", '')
     if any(line.startswith(s) for s in starters):
-        return
+        return None
     line = xmlement.sub('', extlink.sub(r'\1', wikilink.sub(r'\1', line)))
-    line = xmleton.sub('', template.sub('', line))
-    if line: count(line)
-
-log(">>> Reading wikipedia corpus")
-for line in fileinput.input():
-    if INSIDE:
-        if "</text>" in line:
-            INSIDE = False
-        cprint(line)
+    return xmleton.sub('', template.sub('', line))
+
+def count_chunk(chunk):
+    """Count the words in the article texts of a piece of a dump."""
+    counts = Counter()
+    inside = False
+    for line in chunk.split("\n"):
+        if inside:
+            inside = "</text>" not in line
+        elif "<text" in line:
+            inside = "</text>" not in line  # short texts take a single line
+        else:
+            continue
+        line = clean(line)
+        if line:
+            counts.update(w.lower() for w in word.findall(line))
+    return counts
+
+
+def open_dump(name):
+    """Open a dump ("-" is stdin) as text, decompressing it if needed."""
+    if name == "-":
+        name = sys.stdin.buffer
+        magic = name.peek(3)[:3]
     else:
-        if "<text" in line:
-            INSIDE = True
-            cprint(line)
-
-log(">>> Sorting...")
-mc = counts.most_common()
-log(">>> Printing...")
-for w, c in mc:
-    print("{}\t{}".format(w, c))
-log(">>> Done")
+        with open(name, "rb") as f:
+            magic = f.read(3)
+    if magic == b"BZh":
+        return bz2.open(name, "rt", encoding="utf-8")
+    if magic[:2] == b"\x1f\x8b":
+        return gzip.open(name, "rt", encoding="utf-8")
+    if isinstance(name, str):
+        return open(name, encoding="utf-8")
+    return io.TextIOWrapper(name, encoding="utf-8")
+
+def chunks(names, size):
+    """Yield the dumps in pieces of at least size characters, ending after a page."""
+    lines, length = [], 0
+    for name in names:
+        with open_dump(name) as f:
+            for line in f:
+                lines.append(line)
+                length += len(line)
+                if length >= size and "</page>" in line:
+                    yield "".join(lines)
+                    lines, length = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+class Runs(object):
+    """
+    Sorted runs of (key, count) pairs, spilled to temporary files.
+
+    Runs are written as tab-separated lines; read yields them back as
+    iterators that can be merged with heapq.merge.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.paths = []
+
+    def spill(self, pairs):
+        fd, path = tempfile.mkstemp(prefix="counts-", suffix=".tsv", dir=self.directory)
+        self.paths.append(path)
+        with open(fd, "w", encoding="utf-8") as f:
+            f.writelines("{}\t{}\n".format(w, c) for w, c in pairs)
+
+    def read(self):
+        for path in self.paths:
+            yield self.pairs(path)
+
+    @staticmethod
+    def pairs(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                w, c = line.rstrip("\n").split("\t")
+                yield w, int(c)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def remove(self):
+        for path in self.paths:
+            os.remove(path)
+        self.paths = []
+
+
+def counted(pieces, workers):
+    """Yield the counts of every piece, counted by a pool of workers."""
+    if workers <= 1:
+        yield from map(count_chunk, pieces)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from splitter.apply_bounded(pool, count_chunk, ((piece,) for piece in pieces), in_flight=2 * workers)
+
+def count_words(names, *, workers, chunk_size, max_words, runs):
+    """
+    Count the words of the dumps, returning (word, count) pairs sorted by word.
+
+    Partial counts are spilled to runs whenever they hold more than max_words
+    words, and merged in the end.
+    """
+    counts = Counter()
+    for i, piece in enumerate(counted(chunks(names, chunk_size), workers), 1):
+        counts.update(piece)
+        log(">>> Counted piece {}, {} distinct words in memory".format(i, len(counts)))
+        if len(counts) > max_words:
+            log(">>> Spilling...")
+            runs.spill(sorted(counts.items()))
+            counts.clear()
+    if not runs:
+        return sorted(counts.items())
+    log(">>> Merging {} spilled counts...".format(len(runs) + 1))
+    merged = heapq.merge(*runs.read(), sorted(counts.items()))
+    return ((w, sum(c for _, c in group)) for w, group in groupby(merged, key=itemgetter(0)))
+
+def by_frequency(pairs, *, min_count, max_words, runs):
+    """Sort (word, count) pairs most frequent first, spilling like count_words."""
+    frequent_first = lambda pair: (-pair[1], pair[0])
+    batch = []
+    for pair in pairs:
+        if pair[1] < min_count:
+            continue
+        batch.append(pair)
+        if len(batch) >= max_words:
+            runs.spill(sorted(batch, key=frequent_first))
+            batch = []
+    batch.sort(key=frequent_first)
+    if not runs:
+        return batch
+    return heapq.merge(*runs.read(), batch, key=frequent_first)
+
+
+def compile_lexicon(lang, limit):
+    """Compile lex/<lang>.lexicon.tsv for the splitter's default settings."""
+    spl = splitter.Splitter(language=lang, args=docopt.docopt(splitter.__doc__, [
+        '--lang=' + lang, '--limit={}'.format(limit), '--ranking=shortest', '--cache-size=0',
+        '--compile-lexicon',
+        ]))
+    return spl.compile_lexicon()
+
+
+if __name__ == '__main__':
+    args = docopt.docopt(__doc__)
+    max_words = int(args['--max-words'])
+    words, frequencies = Runs(args['--tmp']), Runs(args['--tmp'])
+    try:
+        log(">>> Reading wikipedia corpus")
+        pairs = count_words(
+                args['<dump>'] or ["-"],
+                workers=int(args['--workers'] or os.cpu_count() or 1),
+                chunk_size=int(args['--chunk-size']) << 20,
+                max_words=max_words,
+                runs=words,
+                )
+        log(">>> Sorting...")
+        pairs = by_frequency(pairs, min_count=int(args['--min-count']), max_words=max_words, runs=frequencies)
+        log(">>> Printing...")
+        if args['--compile']:
+            output = os.path.join(ROOT, "lex", args['--compile'] + ".lexicon.tsv")
+        else:
+            output = args['--output']
+        lines = ("{}\t{}\n".format(w, c) for w, c in pairs)
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
+    finally:
+        words.remove()
+        frequencies.remove()
+    if args['--compile']:
+        log(">>> Compiling...")
+        log(">>> Wrote", compile_lexicon(args['--compile'], args['--limit']))
+    log(">>> Done")
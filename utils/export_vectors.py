@@ -0,0 +1,48 @@
+"""
+Usage: python3 export_vectors.py model.pkl lang [float16]
+
+This will read a pickled gensim model (as written by train_embeddings.py) and
+export it into the lightweight format the splitter memory-maps at runtime:
+
+- lex/<lang>.vectors.npy: the vectors as a matrix, one normalized row per word
+- lex/<lang>.vectors.vocab: the words (6-character prefixes), one per line, in
+  the order of the rows
+
+By default, the matrix is stored as float32; pass float16 as the third
+argument to halve its size.
+"""
+import os
+import sys
+import pickle
+import numpy
+
+
+def export(words, vectors, path, dtype="float32"):
+    """Write words and their (normalized) vectors to path.npy and path.vocab."""
+    vectors = numpy.asarray(vectors, dtype="float32")
+    norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    numpy.save(path + ".npy", (vectors / norms).astype(dtype))
+    with open(path + ".vocab", "w", encoding="utf-8") as f:
+        f.write("\n".join(words))
+
+
+def from_model(model):
+    """Return the words and vectors of a gensim Word2Vec model."""
+    kv = getattr(model, "wv", model)
+    if hasattr(kv, "index_to_key"):  # gensim >= 4
+        return kv.index_to_key, kv.vectors
+    return kv.index2word, kv.syn0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        model = pickle.load(f)
+    path = os.path.join(os.path.dirname(__file__), "..", "lex", sys.argv[2] + ".vectors")
+    dtype = sys.argv[3] if len(sys.argv) > 3 else "float32"
+    words, vectors = from_model(model)
+    export(words, vectors, path, dtype)
+    print("Wrote {} vectors to {}.npy".format(len(words), path))
@@ -1,50 +1,157 @@
 """
 Usage: python3 train_embeddings.py raw_file [column]
 
-This will read a gzipped training file that may have two or more tab-seperated
-columns. In that case, the column argument dictates from which column to take
-the sentences (starting with 0). Each line should contain one sentence.
+This will read a (possibly gzipped) training file that may have two or more
+tab-seperated columns. In that case, the column argument dictates from which
+column to take the sentences (starting with 0). Each line should contain one
+sentence.
 
-The generated model will be pickled and written into a file in the vec/
-directory.
+The first time, the sentences are tokenized into 6-character prefixes by
+several processes, and written to a token cache next to the raw file:
+
+- raw_file.<column>.tokens: the token IDs, as 32-bit integers
+- raw_file.<column>.sentences: where each sentence ends, as 64-bit integers
+- raw_file.<column>.vocab: the tokens, one per line, in the order of their IDs
+
+Every training pass then reads the memory-mapped cache instead of the raw file.
+The cache is rebuilt whenever the raw file is newer.
+
+The generated model will be pickled and written into a file in the current
+directory, and its vectors exported into lex/ (see export_vectors.py).
 """
-import gensim
+import os
 import sys
 import gzip
 import pickle
+import multiprocessing
+from array import array
+from itertools import islice
+
+import numpy
+
+from export_vectors import export, from_model
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from splitter import apply_bounded  # noqa: E402
+
+
+def tokenize(line, index=0):
+    """Return the 6-character prefixes of the words in a column of a line."""
+    columns = line.split("\t")
+    if len(columns) <= index:
+        return []
+    return [word[:6].lower() for word in columns[index].split() if word.isalpha()]
+
+def tokenize_chunk(lines, index):
+    """
+    Tokenize a list of lines, numbering the tokens in the order they appear.
+
+    Return the tokens, and the token IDs and the lengths of the (non-empty)
+    sentences as arrays.
+    """
+    ids = {}
+    tokens, lengths = array('I'), array('I')
+    for line in lines:
+        sentence = tokenize(line, index)
+        if sentence:
+            tokens.extend(ids.setdefault(token, len(ids)) for token in sentence)
+            lengths.append(len(sentence))
+    return [*ids], tokens, lengths
+
+
+def read_chunks(path, size=100000):
+    """Yield the lines of a (gzipped) file in lists of size lines."""
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as f:
+        yield from iter(lambda: [*islice(f, size)], [])
+
+def tokenized(path, index, workers):
+    """Yield the tokenized chunks of a file, in order, from a pool of workers."""
+    chunks = ((chunk, index) for chunk in read_chunks(path))
+    with multiprocessing.Pool(workers) as pool:
+        yield from apply_bounded(pool, tokenize_chunk, chunks, in_flight=2 * workers)
+
+def build_cache(path, index, cache, workers=None):
+    """Tokenize the raw file into the token cache (see the usage above)."""
+    vocab = {}
+    end = 0
+    with open(cache + ".tokens.tmp", "wb") as tokens, open(cache + ".sentences.tmp", "wb") as ends:
+        for words, ids, lengths in tokenized(path, index, workers or os.cpu_count() or 1):
+            # renumber the chunk's tokens into the IDs of the whole file
+            numbers = numpy.array([vocab.setdefault(w, len(vocab)) for w in words], dtype=numpy.uint32)
+            tokens.write(numbers[numpy.frombuffer(ids, dtype=numpy.uint32)].tobytes())
+            offsets = numpy.cumsum(numpy.frombuffer(lengths, dtype=numpy.uint32), dtype=numpy.uint64)
+            ends.write((offsets + numpy.uint64(end)).tobytes())
+            end += int(offsets[-1]) if len(offsets) else 0
+    with open(cache + ".vocab.tmp", "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+    # the vocabulary is renamed last, as it is what marks the cache as complete
+    for suffix in (".tokens", ".sentences", ".vocab"):
+        os.replace(cache + suffix + ".tmp", cache + suffix)
+    print("Wrote {} tokens ({} distinct) to {}.tokens".format(end, len(vocab), cache))
+
+
+class TokenCorpus(object):
+    """
+    The sentences of a token cache, as lists of tokens.
+
+    This is an iterable rather than a generator, so that gensim can go over it
+    once per training pass.
+    """
+    block = 10000  # sentences converted at once
+
+    def __init__(self, cache):
+        with open(cache + ".vocab", encoding="utf-8") as f:
+            self.vocab = f.read().split("\n")
+        self.tokens = self.array(cache + ".tokens", numpy.uint32)
+        self.ends = self.array(cache + ".sentences", numpy.uint64)
+
+    @staticmethod
+    def array(path, dtype):
+        if not os.path.getsize(path):
+            return numpy.zeros(0, dtype=dtype)  # empty files can't be mapped
+        return numpy.memmap(path, dtype=dtype, mode="r")
+
+    def __len__(self):
+        return len(self.ends)
 
-class Streamer(object):
-    '''For whatever reason, gensim is fine with iterators, but not with generators.'''
-    def __init__(self, inp, index=0):
-        if ".gz" in inp:
-            self.inp = gzip.open(inp, "rt")
-            self.gz = True
-        else:
-            self.inp = open(inp)
-            self.gz = False
-        self.index = index
     def __iter__(self):
-        self.inp.seek(0)
-        return self
-    def __next__(self):
-        if self.gz:
-            sentence = next(self.inp).split("\t")[self.index]
-            return [word[:6].lower() for word in sentence.split() if word.isalpha()]
-        else:
-            sentence = next(self.inp)
-            return [word[:6].lower() for word in sentence.split() if word.isalpha()]
-    def __del__(self):
-        self.inp.close()
-
-if len(sys.argv) > 2:
-    index = int(sys.argv[2])
-else:
-    index = 0
-
-stream = Streamer(sys.argv[1], index)
-
-model = gensim.models.Word2Vec(stream, sg=1)
-
-with open("output-" + sys.argv[1].split("/")[-1].split("-")[0] + ".pkl", "wb") as f:
-    print("Writing to output-" + sys.argv[1].split("/")[-1].split("-")[0] + ".pkl")
-    pickle.dump(model, f)
+        token = self.vocab.__getitem__
+        start = 0
+        for i in range(0, len(self.ends), self.block):
+            ends = self.ends[i:i+self.block].tolist()
+            base = start
+            ids = self.tokens[base:ends[-1]].tolist()
+            for end in ends:
+                yield [*map(token, ids[start-base:end-base])]
+                start = end
+
+
+def cached_corpus(path, index=0):
+    """Return the TokenCorpus of a raw file, building its cache if needed."""
+    cache = "{}.{}".format(path, index)
+    if not os.path.exists(cache + ".vocab") or os.path.getmtime(cache + ".vocab") < os.path.getmtime(path):
+        build_cache(path, index, cache)
+    return TokenCorpus(cache)
+
+
+if __name__ == '__main__':
+    import gensim
+
+    if len(sys.argv) > 2:
+        index = int(sys.argv[2])
+    else:
+        index = 0
+
+    corpus = cached_corpus(sys.argv[1], index)
+
+    model = gensim.models.Word2Vec(corpus, sg=1, workers=os.cpu_count() or 1)
+
+    lang = sys.argv[1].split("/")[-1].split("-")[0]
+    with open("output-" + lang + ".pkl", "wb") as f:
+        print("Writing to output-" + lang + ".pkl")
+        pickle.dump(model, f)
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lex", lang + ".vectors")
+    words, vectors = from_model(model)
+    export(words, vectors, path)
+    print("Wrote {} vectors to {}.npy".format(len(words), path))